@@ -1,15 +1,33 @@
-from flask import Flask, request, abort
+import os
+import sys
+from flask import Flask, request, abort, jsonify
 import json
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
+
+# the repository's shared/ package (token issuers, JWKS and verified-token
+# caches)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from shared import issuer, jwks, token_cache
 
 
 app = Flask(__name__)
 
-AUTH0_DOMAIN = @TODO_REPLACE_WITH_YOUR_DOMAIN
+AUTH0_DOMAIN = os.environ.get('AUTH0_DOMAIN', 'TODO_REPLACE_WITH_YOUR_DOMAIN')
 ALGORITHMS = ['RS256']
-API_AUDIENCE = @TODO_REPLACE_WITH_YOUR_API_AUDIENCE
+API_AUDIENCE = os.environ.get('API_AUDIENCE', 'TODO_REPLACE_WITH_YOUR_API_AUDIENCE')
+
+# Who issues the tokens: Auth0, or with AUTH_ISSUER=local a key pair held
+# in-process, for tests and offline load tests (see shared/issuer.py).
+ISSUER = issuer.from_environ(AUTH0_DOMAIN, API_AUDIENCE)
+
+# The issuer's signing keys, cached and refreshed in the background. Set
+# JWKS_FILE to verify against a local key set instead, e.g. offline.
+JWKS = jwks.JWKSProvider(ISSUER.fetcher())
+
+# payloads of tokens that verified, until they expire, so a reused token
+# skips the signature check
+TOKENS = token_cache.TokenCache()
 
 
 class AuthError(Exception):
@@ -29,7 +47,7 @@ def get_token_auth_header():
         }, 401)
 
     parts = auth.split()
-    if parts[0].lower() != 'bearer':
+    if not parts or parts[0].lower() != 'bearer':
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization header must start with "Bearer".'
@@ -52,8 +70,6 @@ def get_token_auth_header():
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
     rsa_key = {}
     if 'kid' not in unverified_header:
@@ -62,23 +78,23 @@ def verify_decode_jwt(token):
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    key = JWKS.get_key(unverified_header['kid'])
+    if key is not None:
+        rsa_key = {
+            'kty': key['kty'],
+            'kid': key['kid'],
+            'use': key['use'],
+            'n': key['n'],
+            'e': key['e']
+        }
     if rsa_key:
         try:
             payload = jwt.decode(
                 token,
                 rsa_key,
                 algorithms=ALGORITHMS,
-                audience=API_AUDIENCE,
-                issuer='https://' + AUTH0_DOMAIN + '/'
+                audience=ISSUER.audience,
+                issuer=ISSUER.issuer
             )
 
             return payload
@@ -105,12 +121,17 @@ def verify_decode_jwt(token):
             }, 400)
 
 
+@app.errorhandler(AuthError)
+def auth_error(error):
+    return jsonify(error.error), error.status_code
+
+
 def requires_auth(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
         token = get_token_auth_header()
         try:
-            payload = verify_decode_jwt(token)
+            payload = TOKENS.verify(token, verify_decode_jwt)
         except:
             abort(401)
         return f(payload, *args, **kwargs)
@@ -121,4 +142,10 @@ def requires_auth(f):
 @requires_auth
 def headers(payload):
     print(payload)
-    return 'Access Granted'
\ No newline at end of file
+    return 'Access Granted'
+
+
+@app.route('/token-cache/stats')
+@requires_auth
+def token_cache_stats(payload):
+    return jsonify(TOKENS.stats())
\ No newline at end of file
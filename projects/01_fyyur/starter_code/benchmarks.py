@@ -0,0 +1,295 @@
+#----------------------------------------------------------------------------#
+# Micro-benchmarks for Fyyur's hot paths.
+#
+#   python benchmarks.py            # run all
+#   python benchmarks.py search     # run the ones whose name contains "search"
+#
+# None of these need a database server. bench_show_window and
+# bench_detail_latency build their datasets at BENCH_DATABASE_URL (default: a
+# SQLite file), so they can also be pointed at a scratch PostgreSQL database.
+# bench_detail_latency serves the app over HTTP and reports p50/p99 latency
+# with and without PAGE_QUERY_WORKERS.
+#----------------------------------------------------------------------------#
+
+import random
+import string
+import os
+import subprocess
+import sys
+import time
+
+
+def timed(fn, repeat=5):
+    # best of `repeat` runs, in milliseconds
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_ngram_search(num_rows=1000000):
+    from search import NgramIndex
+
+    rng = random.Random(0)
+    words = [''.join(rng.choice(string.ascii_lowercase)
+                     for _ in range(rng.randint(3, 9))) for _ in range(20000)]
+    index = NgramIndex()
+    start = time.perf_counter()
+    for row_id in range(num_rows):
+        index.add(row_id, ' '.join(rng.sample(words, 3)))
+    print('ngram index: built %d names in %.1fs' % (num_rows, time.perf_counter() - start))
+    for term in (words[0], words[1][:3], words[2] + ' ' + words[3][:2], 'zzzz'):
+        ms = timed(lambda: index.rank(term, index.match(term), 20))
+        print('  %-20r %.3f ms' % (term, ms))
+
+
+def bench_datetime_filter(num_rows=10000):
+    import babel.dates
+    import dateutil.parser
+    from datetime import datetime, timedelta
+    from dates import PATTERNS, format_datetime, format_datetimes
+
+    def legacy(value, format='medium'):
+        # the filter as it was: parse the view's string, look up the pattern
+        date = dateutil.parser.parse(value)
+        return babel.dates.format_datetime(date, PATTERNS.get(format, format))
+
+    rng = random.Random(0)
+    start = datetime(2020, 1, 1, 18)
+    # shows start on the hour or half hour, so timestamps repeat
+    values = [start + timedelta(minutes=30 * rng.randrange(8760)) for _ in range(num_rows)]
+    strings = [value.strftime("%m/%d/%Y, %H:%M:%S") for value in values]
+    print('datetime filter, %d rows:' % num_rows)
+    print('  legacy (parse + babel)   %.1f ms' % timed(
+        lambda: [legacy(value, 'full') for value in strings], repeat=3))
+    print('  compiled, per row        %.1f ms' % timed(
+        lambda: [format_datetime(value, 'full') for value in values], repeat=3))
+    print('  compiled, batch          %.1f ms' % timed(
+        lambda: format_datetimes(values, 'full'), repeat=3))
+
+
+def bench_read_models(num_rows=10000):
+    import tracemalloc
+    from app import create_app
+    from models import db, Genre, Venue
+    from models.Genre import venue_genres
+    import read_models
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True})
+    with app.app_context():
+        db.create_all()
+        genres = [Genre(name=name) for name in ('Jazz', 'Blues', 'Folk')]
+        db.session.add_all(genres)
+        db.session.flush()
+        db.session.execute(Venue.__table__.insert(), [{
+            'id': i, 'name': 'Venue %d' % i, 'city': 'Austin', 'state': 'TX',
+            'address': '%d Main St' % i, 'phone': '555-0100', 'image_link': 'https://i.com/%d' % i,
+            'facebook_link': 'https://fb.com/%d' % i, 'webpage_link': 'https://v.com/%d' % i,
+            'description': 'Looking for bands', 'seeking_talent': True
+        } for i in range(1, num_rows + 1)])
+        db.session.execute(venue_genres.insert(), [
+            {'venue_id': i, 'genre_id': genres[i % 3].id} for i in range(1, num_rows + 1)])
+        db.session.commit()
+
+        def orm():
+            rows = Venue.query.order_by(Venue.id).all()
+            data = [venue.dictionary() for venue in rows]
+            db.session.remove()
+            return rows, data
+
+        def slim():
+            rows = read_models.venue_rows()
+            return rows, [row.dictionary() for row in rows]
+
+        print('venues, %d rows:' % num_rows)
+        for name, load in (('ORM dictionary()', orm), ('read models', slim)):
+            ms = timed(load, repeat=3)
+            tracemalloc.start()
+            rows, data = load()
+            held = tracemalloc.get_traced_memory()[0]
+            del data
+            rows_only = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del rows
+            print('  %-18s %7.1f ms, %6.1f MB with dicts, %6.1f MB rows alone' % (
+                name, ms, held / 2 ** 20, rows_only / 2 ** 20))
+
+
+SHOWS_SQL = {
+    # show i: one every 3 minutes from 2020-01-01, at venue i % V, by
+    # artist i * 7 % A
+    'postgresql': '''
+        INSERT INTO "Show" (venue_id, artist_id, start_time)
+        SELECT 1 + i % :venues, 1 + i * 7 % :artists,
+               timestamp '2020-01-01' + i * interval '3 minutes'
+        FROM generate_series(:first, :last) i''',
+    'sqlite': '''
+        WITH RECURSIVE s(i) AS (SELECT :first UNION ALL SELECT i + 1 FROM s WHERE i < :last)
+        INSERT INTO "Show" (venue_id, artist_id, start_time)
+        SELECT 1 + i % :venues, 1 + i * 7 % :artists,
+               datetime('2020-01-01', '+' || (i * 3) || ' minutes') || '.000000'
+        FROM s''',
+}
+
+
+def bench_show_window(num_shows=10000000, num_venues=20000, num_artists=50000):
+    from datetime import datetime, timedelta
+    from sqlalchemy import text
+    from app import create_app
+    from models import db, Genre, Show, Venue, Artist
+    from models.Genre import artist_genres
+    import queries
+
+    url = os.environ.get('BENCH_DATABASE_URL', 'sqlite:////tmp/fyyur_bench.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'TESTING': True})
+    with app.app_context():
+        db.create_all()
+        if db.session.query(Show.id).order_by(Show.id.desc()).limit(1).scalar() != num_shows:
+            start = time.perf_counter()
+            db.session.execute(Venue.__table__.insert(), [{
+                'id': i, 'name': 'Venue %d' % i, 'state': ('CA', 'NY', 'TX')[i % 3],
+                'city': 'City %d' % (i % 200)} for i in range(1, num_venues + 1)])
+            db.session.execute(Artist.__table__.insert(), [
+                {'id': i, 'name': 'Artist %d' % i} for i in range(1, num_artists + 1)])
+            genres = [Genre(name='Genre %d' % i) for i in range(20)]
+            db.session.add_all(genres)
+            db.session.flush()
+            db.session.execute(artist_genres.insert(), [
+                {'artist_id': i, 'genre_id': genres[i % 20].id} for i in range(1, num_artists + 1)])
+            sql = text(SHOWS_SQL[db.engine.dialect.name])
+            for first in range(1, num_shows + 1, 1000000):
+                db.session.execute(sql, {'first': first, 'last': min(first + 999999, num_shows),
+                                         'venues': num_venues, 'artists': num_artists})
+            db.session.commit()
+            db.session.execute(text('ANALYZE'))
+            print('show window: built %d shows in %.0fs' % (num_shows, time.perf_counter() - start))
+
+        middle = datetime(2020, 1, 1) + timedelta(minutes=3 * num_shows // 2)
+        print('show window, %d shows, first page of 30:' % num_shows)
+        for label, args in (
+                ('1 day', {}),
+                ('1 day, city', {'state': 'CA', 'city': 'City 3'}),
+                ('1 day, genre', {'genre': 'Genre 7'}),
+                ('30 days, city+genre', {'state': 'CA', 'city': 'City 3', 'genre': 'Genre 7',
+                                         'end': middle + timedelta(days=30)})):
+            args = dict({'start': middle, 'end': middle + timedelta(days=1)}, **args)
+            ms = timed(lambda: queries.show_page(limit=30, **args))
+            print('  %-22s %8.2f ms' % (label, ms))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def bench_detail_latency(num_venues=200, requests=1000, concurrency=(1, 8)):
+    # Load test of the venue/artist detail pages over HTTP, with their
+    # queries run one after another and then gathered on PAGE_QUERY_WORKERS
+    # threads, for each number of concurrent clients.
+    # BENCH_DB_LATENCY_MS (default 2) is added to every statement to stand
+    # in for the network round trip a local SQLite file does not have; set
+    # it to 0 against a real BENCH_DATABASE_URL.
+    import tempfile
+    import threading
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import create_app
+    from models import db, Genre, Show, Venue, Artist
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    directory = tempfile.TemporaryDirectory()
+    url = os.environ.get('BENCH_DATABASE_URL', 'sqlite:///%s/fyyur.db' % directory.name)
+    latency = float(os.environ.get('BENCH_DB_LATENCY_MS', 2)) / 1000
+
+    def serve(clients, workers):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'TESTING': True, 'CACHE_BACKEND': None,
+                          'PAGE_QUERY_WORKERS': workers, 'QUERY_PROFILER': False,
+                          # a connection for every thread that may query
+                          'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': clients + workers}})
+        with app.app_context():
+            db.create_all()
+            if not Venue.query.count():
+                genres = Genre.named(['Jazz', 'Blues'])
+                artists = [Artist(name='Artist %d' % i, genres=genres) for i in range(50)]
+                db.session.add_all(artists)
+                now = datetime.today()
+                for i in range(num_venues):
+                    venue = Venue(name='Venue %d' % i, city='Austin', state='TX', genres=genres)
+                    db.session.add(venue)
+                    db.session.flush()
+                    db.session.add_all(Show(venue_id=venue.id, artist_id=artists[(i + days) % 50].id,
+                                            start_time=now + timedelta(days=days))
+                                       for days in range(-5, 5))
+                db.session.commit()
+            db.session.remove()
+            event.listen(db.engine, 'before_cursor_execute', lambda *args: time.sleep(latency))
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return app, server
+
+    for clients in concurrency:
+        print('detail pages, %d requests from %d clients, +%.1f ms per query:' % (
+            requests, clients, latency * 1000))
+        for label, workers in (('sequential', 0), ('gathered', 3 * clients)):
+            app, server = serve(clients, workers)
+            base = 'http://127.0.0.1:%d' % server.server_port
+
+            def fetch(i):
+                path = '/venues/%d' % (1 + i % num_venues) if i % 2 else '/artists/%d' % (1 + i % 50)
+                start = time.perf_counter()
+                urllib.request.urlopen(base + path).read()
+                return (time.perf_counter() - start) * 1000
+
+            with ThreadPoolExecutor(clients) as pool:
+                list(pool.map(fetch, range(clients * 2)))  # warm up
+                start = time.perf_counter()
+                times = list(pool.map(fetch, range(requests)))
+                elapsed = time.perf_counter() - start
+            server.shutdown()
+            if workers:
+                app.extensions['page_executor'].shutdown()
+            with app.app_context():
+                db.get_engine(app).dispose()
+            print('  %-12s p50 %6.1f ms, p99 %6.1f ms, %6.0f req/s' % (
+                label, percentile(times, 0.5), percentile(times, 0.99), requests / elapsed))
+
+
+COLD_START = '''
+import sys, time
+start = time.perf_counter()
+from app import create_app
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True})
+created = time.perf_counter()
+app.test_client().get('/')
+print(created - start, time.perf_counter() - created, len(sys.modules))
+'''
+
+
+def bench_startup(repeat=5):
+    # fresh interpreter per run: import + create_app(), then the first request
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', COLD_START])
+        runs.append([float(field) for field in out.split()])
+    create, first, modules = min(runs)
+    print('startup: create_app %.1f ms, first request %.1f ms, %d modules loaded'
+          % (create * 1000, first * 1000, modules))
+
+
+BENCHMARKS = [bench_ngram_search, bench_startup, bench_datetime_filter, bench_read_models,
+              bench_show_window, bench_detail_latency]
+
+if __name__ == '__main__':
+    selected = sys.argv[1:]
+    for bench in BENCHMARKS:
+        if not selected or any(name in bench.__name__ for name in selected):
+            bench()
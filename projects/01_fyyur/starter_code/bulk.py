@@ -0,0 +1,497 @@
+#----------------------------------------------------------------------------#
+# Bulk import/export of venues, artists and shows.
+#
+# Imports read CSV (a header row naming the fields) or JSON Lines, in chunks
+# of CHUNK_SIZE rows. Each chunk is validated with the forms.py form of its
+# kind, one bound form reused for every row. The valid rows are written with
+# one multi-row statement per table: COPY on PostgreSQL (psycopg2),
+# executemany elsewhere. Each chunk is committed on its own.
+#
+# Exports stream the same fields back out, so an export can be imported into
+# another database.
+#
+# Rows may carry an id. It is kept, which lets a shows file refer to the
+# venues and artists of the same catalog. Rows without one get fresh ids.
+# Genres are a comma-separated string in CSV and a list in JSON Lines.
+# Shows that would double-book a venue or artist are rejected like invalid
+# rows.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+
+from models import db, Genre, Show, Venue, Artist
+from models.Genre import venue_genres, artist_genres
+from models.Show import MAX_DURATION
+import replicas
+import show_counts
+import versions
+from cache import invalidate
+from search import get_backend
+import schedule
+
+CHUNK_SIZE = 1000
+
+# the most rejected rows a report lists
+MAX_ERRORS = 100
+
+FORMATS = ('csv', 'jsonl')
+
+# start_time as ShowForm's DateTimeField parses it
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# errors of a file that cannot be read as the format it claims
+BAD_INPUT = (csv.Error, ValueError)
+# and of one whose ids clash with rows in the table
+CONFLICT = (IntegrityError,)
+
+
+class ImportFailed(Exception):
+    '''
+    A chunk of an import failed with error. report counts the rows read so
+    far; its inserted rows stay committed.
+    '''
+
+    def __init__(self, report, error):
+        self.report = report
+        self.error = error
+        super().__init__(str(error))
+
+
+class Kind(object):
+    '''
+    What the pipeline needs to know about one importable model.
+    '''
+
+    def __init__(self, model, form, fields, genres=None, flag=None):
+        self.model = model
+        self.form = form  # name of the forms.py class
+        self.fields = fields  # columns read and written, besides id and genres
+        self.genres = genres  # association table, if the model has genres
+        self.flag = flag  # boolean column set when there is a description
+
+    @property
+    def table(self):
+        return self.model.__table__
+
+    @property
+    def integers(self):
+        return [field for field in self.fields
+                if isinstance(self.table.c[field].type, db.Integer)]
+
+    @property
+    def defaults(self):
+        # fields left blank get the column default, as an ORM insert would
+        return {field: self.table.c[field].default.arg for field in self.fields
+                if self.table.c[field].default is not None
+                and self.table.c[field].default.is_scalar}
+
+    @property
+    def columns(self):
+        return ('id',) + self.fields + (('genres',) if self.genres is not None else ())
+
+
+KINDS = {
+    'venues': Kind(Venue, 'VenueForm', (
+        'name', 'city', 'state', 'address', 'phone', 'image_link',
+        'facebook_link', 'webpage_link', 'description'),
+        venue_genres, 'seeking_talent'),
+    'artists': Kind(Artist, 'ArtistForm', (
+        'name', 'city', 'state', 'phone', 'image_link', 'facebook_link',
+        'webpage_link', 'description'),
+        artist_genres, 'seeking_venue'),
+    'shows': Kind(Show, 'ShowForm', ('venue_id', 'artist_id', 'start_time', 'duration')),
+}
+
+
+class Report(object):
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.errors = []  # (row number, {field: [messages]})
+        self.rejected = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def reject(self, number, errors):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((number, errors))
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def dictionary(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'errors': [{'row': number, 'errors': errors} for number, errors in self.errors],
+            'seconds': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1)
+        }
+
+
+#  Reading
+#  ----------------------------------------------------------------
+
+def read_rows(stream, format):
+    '''
+    Yields one dict per record of a text stream in the given format.
+    '''
+    if format == 'csv':
+        return csv.DictReader(stream)
+    if format == 'jsonl':
+        return json_lines(stream)
+    raise ValueError('unknown format %r' % format)
+
+
+def json_lines(stream):
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError('line %d is not a JSON object' % number)
+            yield row
+
+
+def chunked(rows, size=CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+#  Validation
+#  ----------------------------------------------------------------
+
+def genre_names(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    return [name.strip() for name in value or () if name.strip()]
+
+
+def form_data(kind, row):
+    data = MultiDict((field, '' if row.get(field) is None else str(row[field]))
+                     for field in kind.fields)
+    if kind.genres is not None:
+        for name in genre_names(row.get('genres')):
+            data.add('genres', name)
+    return data
+
+
+def validate(kind, form, chunk, first_number, report):
+    '''
+    Runs each row of chunk through form and returns the valid ones as column
+    dicts. Rows are numbered from first_number in the report.
+    '''
+    valid = []
+    defaults = kind.defaults
+    for number, row in enumerate(chunk, first_number):
+        form.process(form_data(kind, row))
+        if not form.validate():
+            report.reject(number, form.errors)
+            continue
+        values = {field: None if form[field].data == '' else form[field].data
+                  for field in kind.fields}
+        for field, default in defaults.items():
+            if values[field] is None:
+                values[field] = default
+        try:
+            for field in kind.integers:
+                if values[field] is not None:
+                    values[field] = int(values[field])
+            if row.get('id') not in (None, ''):
+                values['id'] = int(row['id'])
+        except ValueError:
+            report.reject(number, {'id': ['Not a valid integer value.']})
+            continue
+        if kind.genres is not None:
+            values['genres'] = genre_names(row.get('genres'))
+            values[kind.flag] = bool(values.get('description'))
+        valid.append((number, values))
+    return valid
+
+
+def check_show_owners(connection, rows, report):
+    '''
+    Drops the shows whose venue or artist does not exist.
+    '''
+    kept = []
+    existing = {}
+    for model, fk in show_counts.OWNERS:
+        ids = {values[fk] for _, values in rows}
+        existing[fk] = {row[0] for row in connection.execute(
+            select([model.id]).where(model.id.in_(ids)))} if ids else set()
+    for number, values in rows:
+        missing = {fk: ['No such %s.' % fk[:-3]] for fk in existing
+                   if values[fk] not in existing[fk]}
+        if missing:
+            report.reject(number, missing)
+        else:
+            kept.append((number, values))
+    return kept
+
+
+def check_show_slots(connection, rows, report):
+    '''
+    Drops the shows that overlap a show of the same venue or artist, either
+    in the table or earlier in rows.
+    '''
+    if not rows:
+        return rows
+    index = schedule.IntervalIndex(timedelta(minutes=MAX_DURATION))
+    slots = [(number, values, values['start_time'],
+              values['start_time'] + timedelta(minutes=values['duration']))
+             for number, values in rows]
+    earliest = min(start for _, _, start, _ in slots) - index.max_length
+    latest = max(end for _, _, _, end in slots)
+    booked = connection.execute(
+        select([Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.duration]).where(
+            (Show.venue_id.in_({values['venue_id'] for _, values in rows})
+             | Show.artist_id.in_({values['artist_id'] for _, values in rows}))
+            & (Show.start_time > earliest) & (Show.start_time < latest)))
+    for show in booked:
+        end = show.start_time + timedelta(minutes=show.duration)
+        for owner, _ in schedule.OWNERS:
+            index.add((owner, show[owner]), show.start_time, end, (owner, show.id))
+    kept = []
+    for number, values, start, end in slots:
+        busy = [owner for owner, _ in schedule.OWNERS
+                if index.overlapping((owner, values[owner]), start, end) is not None]
+        if busy:
+            report.reject(number, {'start_time': [
+                str(schedule.ScheduleConflict(owner, values[owner])) for owner in busy]})
+            continue
+        for owner, _ in schedule.OWNERS:
+            index.add((owner, values[owner]), start, end, (owner, 'row', number))
+        kept.append((number, values))
+    return kept
+
+
+#  Writing
+#  ----------------------------------------------------------------
+
+def reserve_ids(connection, table, count, above=0):
+    '''
+    count new ids for table, all greater than above and than any id in the
+    table, in one round trip.
+    '''
+    if connection.dialect.name == 'postgresql':
+        sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                                      table='"%s"' % table.name).scalar()
+        if above:
+            # the file supplied ids of its own; move the serial past them,
+            # but never back: other sessions may hold ids above them
+            connection.execute(text(
+                'SELECT setval(:sequence, wanted) '
+                'FROM %s, (SELECT GREATEST(:above, max(id)) AS wanted FROM "%s") AS ids '
+                'WHERE wanted > last_value OR (wanted = last_value AND NOT is_called)'
+                % (sequence, table.name)), sequence=sequence, above=above)
+        if not count:
+            return []
+        return [row[0] for row in connection.execute(text(
+            'SELECT nextval(:sequence) FROM generate_series(1, :count)'),
+            sequence=sequence, count=count)]
+    # no sequences: count up from the current maximum, assuming one importer
+    # at a time
+    start = connection.execute(select([func.coalesce(func.max(table.c.id), 0)])).scalar()
+    start = max(start, above)
+    return list(range(start + 1, start + 1 + count))
+
+
+def copy_rows(connection, table, columns, rows):
+    '''
+    Inserts rows (tuples in columns order) with COPY ... FROM STDIN.
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if value is None else value for value in row])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert('COPY "%s" (%s) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')' % (
+        table.name, ', '.join('"%s"' % column for column in columns)), buffer)
+    # unseen by SQLAlchemy's execute events
+    replicas.wrote()
+
+
+def insert_rows(connection, table, rows):
+    '''
+    Inserts a list of column dicts with one bulk statement.
+    '''
+    if not rows:
+        return
+    if connection.dialect.driver == 'psycopg2':
+        columns = list(rows[0])
+        copy_rows(connection, table, columns, [tuple(row[c] for c in columns) for row in rows])
+    else:
+        connection.execute(table.insert(), rows)
+
+
+def write_chunk(kind, rows):
+    connection = db.session.connection()
+    rows = [values for _, values in rows]
+    supplied = [values['id'] for values in rows if 'id' in values]
+    fresh = iter(reserve_ids(connection, kind.table, len(rows) - len(supplied),
+                             max(supplied, default=0)))
+    for values in rows:
+        if 'id' not in values:
+            values['id'] = next(fresh)
+
+    links = []
+    if kind.genres is not None:
+        genres = {genre.name: genre for genre in Genre.named(
+            [name for values in rows for name in values['genres']])}
+        db.session.add_all(genres.values())
+        db.session.flush()
+        key = kind.genres.c.keys()[0]
+        links = [{key: values['id'], 'genre_id': genres[name].id}
+                 for values in rows for name in dict.fromkeys(values.pop('genres'))]
+
+    insert_rows(connection, kind.table, rows)
+    insert_rows(connection, kind.genres, links)
+    versions.changed(db.session, versions.AFFECTS[kind.model])
+    if kind.model is Show:
+        # the inserts bypass the flush hooks that keep the counters current
+        show_counts.refresh(connection, {values['venue_id'] for values in rows},
+                            {values['artist_id'] for values in rows})
+
+
+def import_rows(kind_name, rows, chunk_size=CHUNK_SIZE):
+    '''
+    Validates and inserts an iterable of row dicts of the given kind
+    ('venues', 'artists' or 'shows'), committing every chunk_size rows.
+    Returns a Report. A failing chunk is rolled back and ImportFailed raised
+    with the report so far; earlier chunks stay committed.
+    '''
+    import forms
+
+    kind = KINDS[kind_name]
+    form = getattr(forms, kind.form)(formdata=None, meta={'csrf': False})
+    report = Report()
+    try:
+        for chunk in chunked(rows, chunk_size):
+            first = report.rows + 1
+            report.rows += len(chunk)
+            valid = validate(kind, form, chunk, first, report)
+            if kind.model is Show:
+                valid = check_show_owners(db.session.connection(), valid, report)
+                valid = check_show_slots(db.session.connection(), valid, report)
+            if valid:
+                write_chunk(kind, valid)
+            db.session.commit()
+            report.inserted += len(valid)
+    except Exception as error:
+        db.session.rollback()
+        raise ImportFailed(report.finish(), error) from error
+    except:
+        db.session.rollback()
+        raise
+    finally:
+        if report.inserted:
+            # every page may show the new rows
+            invalidate('venues', 'artists', 'shows', 'venue-pages', 'artist-pages')
+            if kind.model is not Show:
+                get_backend().invalidate(kind.model)
+            else:
+                # the inserts bypass the listeners keeping the index current
+                schedule.get_schedule().invalidate()
+    return report.finish()
+
+
+#  Export
+#  ----------------------------------------------------------------
+
+def export_rows(kind_name, chunk_size=CHUNK_SIZE):
+    '''
+    Yields every row of the given kind as a dict of its import columns,
+    reading chunk_size rows at a time through a server-side cursor where the
+    driver has one.
+    '''
+    kind = KINDS[kind_name]
+    table = kind.table
+    query = select([table.c.id] + [table.c[field] for field in kind.fields]).order_by(table.c.id)
+    result = db.session.connection().execution_options(stream_results=True).execute(query)
+    while True:
+        batch = result.fetchmany(chunk_size)
+        if not batch:
+            return
+        rows = [dict(row) for row in batch]
+        if kind.genres is not None:
+            key = kind.genres.c.keys()[0]
+            genres = {row['id']: [] for row in rows}
+            for owner_id, name in db.session.execute(
+                    select([kind.genres.c[key], Genre.name])
+                    .where(kind.genres.c.genre_id == Genre.id)
+                    .where(kind.genres.c[key].in_(list(genres)))
+                    .order_by(kind.genres.c[key], Genre.name)):
+                genres[owner_id].append(name)
+            for row in rows:
+                row['genres'] = genres[row['id']]
+        for row in rows:
+            if isinstance(row.get('start_time'), datetime):
+                row['start_time'] = row['start_time'].strftime(TIME_FORMAT)
+        yield from rows
+
+
+def write_rows(kind_name, rows, format):
+    '''
+    Yields rows (from export_rows) serialized in the given format, one
+    string per row after an optional header.
+    '''
+    columns = KINDS[kind_name].columns
+    if format == 'jsonl':
+        for row in rows:
+            yield json.dumps(row) + '\n'
+        return
+    if format != 'csv':
+        raise ValueError('unknown format %r' % format)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        if 'genres' in row:
+            row['genres'] = ','.join(row['genres'])
+        writer.writerow([row[column] for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export(kind_name, format, chunk_size=CHUNK_SIZE, report=None):
+    '''
+    Streams a whole table as CSV or JSON Lines text. Counts rows into report
+    (a Report) as they are written, if given.
+    '''
+    rows = export_rows(kind_name, chunk_size)
+    if report is not None:
+        rows = counted(rows, report)
+    yield from write_rows(kind_name, rows, format)
+    if report is not None:
+        report.finish()
+
+
+def counted(rows, report):
+    for row in rows:
+        report.rows += 1
+        yield row
@@ -0,0 +1,294 @@
+#----------------------------------------------------------------------------#
+# Response cache.
+#
+# Read pages are cached whole by @cached_page and view-model dicts by
+# remember(). Every entry carries tags naming what it was built from
+# ('venues', 'venue:3', ...); write handlers call invalidate() with the tags
+# their change affects.
+#
+# Backends (CACHE_BACKEND):
+#   'memory' -- MemoryCache, a per-process LRU with per-entry TTL. A write
+#               invalidates only the cache of the process that handled it,
+#               so use it with a single worker process only
+#   'redis'  -- RedisCache, shared through any Redis-compatible server at
+#               CACHE_REDIS_URL (needs the redis package); safe with any
+#               number of workers
+#   None     -- caching off (the default)
+#
+# With read replicas (replicas.py), a client whose requests are pinned to the
+# primary after a write neither reads nor fills the cache. An invalidation
+# also holds off filling its tags from replica reads for
+# REPLICA_STICKY_SECONDS, since a replica may not have the write yet.
+#----------------------------------------------------------------------------#
+
+import math
+import pickle
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from flask import Response, current_app, make_response, request, session
+
+import replicas
+
+
+class Cache(object):
+    '''
+    Base class; counts hits and misses around the backend's lookup().
+    '''
+
+    def __init__(self, default_ttl=300):
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        value = self.lookup(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def lookup(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, tags=(), ttl=None):
+        raise NotImplementedError
+
+    def invalidate(self, *tags, hold=0):
+        '''
+        Drops the entries with any of tags; for hold seconds after, held()
+        is true of them.
+        '''
+        raise NotImplementedError
+
+    def held(self, tags):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0
+        }
+
+
+class MemoryCache(Cache):
+
+    def __init__(self, max_entries=1024, default_ttl=300):
+        super().__init__(default_ttl)
+        self.max_entries = max_entries
+        # key -> (expires_at, value, tags), least recently used first
+        self.entries = OrderedDict()
+        self.tagged = defaultdict(set)
+        self.holds = {}  # tag -> time.monotonic() its hold ends
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self.discard(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, tags=(), ttl=None):
+        expires_at = time.monotonic() + (ttl or self.default_ttl)
+        with self.lock:
+            self.discard(key)
+            self.entries[key] = (expires_at, value, tuple(tags))
+            for tag in tags:
+                self.tagged[tag].add(key)
+            while len(self.entries) > self.max_entries:
+                self.discard(next(iter(self.entries)))
+
+    def invalidate(self, *tags, hold=0):
+        with self.lock:
+            for tag in tags:
+                if hold > 0:
+                    self.holds[tag] = time.monotonic() + hold
+                for key in list(self.tagged.get(tag, ())):
+                    self.discard(key)
+
+    def held(self, tags):
+        now = time.monotonic()
+        with self.lock:
+            for tag in tags:
+                until = self.holds.get(tag)
+                if until is not None and until <= now:
+                    del self.holds[tag]
+                elif until is not None:
+                    return True
+        return False
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tagged.clear()
+            self.holds.clear()
+
+    def discard(self, key):
+        # callers hold the lock
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self.tagged[tag]
+            keys.discard(key)
+            if not keys:
+                del self.tagged[tag]
+
+    def stats(self):
+        stats = super().stats()
+        stats['entries'] = len(self.entries)
+        return stats
+
+
+# Deletes a tag's set (KEYS[1]) and every key in it in one step, so an entry
+# tagged while an invalidation runs is either deleted with it or tagged after
+# it; with ARGV[1] > 0, first sets the tag's hold key (KEYS[2]) for that many
+# seconds
+INVALIDATE_SCRIPT = '''
+if tonumber(ARGV[1]) > 0 then
+    redis.call('SETEX', KEYS[2], ARGV[1], 1)
+end
+local keys = redis.call('SMEMBERS', KEYS[1])
+for i = 1, #keys, 1000 do
+    redis.call('DEL', unpack(keys, i, math.min(i + 999, #keys)))
+end
+redis.call('DEL', KEYS[1])
+return #keys
+'''
+
+
+class RedisCache(Cache):
+    '''
+    Stores pickled values under prefix + key with SETEX, and the keys of each
+    tag in a set at prefix + 'tag:' + tag; a held tag has a key at prefix +
+    'hold:' + tag until its hold ends. Entries are set (MULTI/EXEC) and
+    invalidated (a Lua script) atomically. Hit/miss counts are per process.
+    '''
+
+    def __init__(self, client, default_ttl=300, prefix='fyyur:'):
+        super().__init__(default_ttl)
+        self.client = client
+        self.prefix = prefix
+        self.invalidate_tag = client.register_script(INVALIDATE_SCRIPT)
+
+    def lookup(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, tags=(), ttl=None):
+        ttl = ttl or self.default_ttl
+        pipe = self.client.pipeline(transaction=True)
+        pipe.setex(self.prefix + key, ttl, pickle.dumps(value))
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            pipe.sadd(tag_key, self.prefix + key)
+            # outlive every entry in the set; stale members are harmless
+            pipe.expire(tag_key, ttl)
+        pipe.execute()
+
+    def invalidate(self, *tags, hold=0):
+        for tag in tags:
+            self.invalidate_tag(keys=[self.prefix + 'tag:' + tag, self.prefix + 'hold:' + tag],
+                                args=[int(math.ceil(hold))])
+
+    def held(self, tags):
+        tags = list(tags)
+        return bool(tags) and self.client.exists(
+            *[self.prefix + 'hold:' + tag for tag in tags]) > 0
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+def make_cache(config):
+    kind = config.get('CACHE_BACKEND')
+    ttl = config.get('CACHE_TTL', 300)
+    if kind == 'memory':
+        return MemoryCache(config.get('CACHE_MAX_ENTRIES', 1024), ttl)
+    if kind == 'redis':
+        import redis
+        return RedisCache(redis.Redis.from_url(config['CACHE_REDIS_URL']), ttl)
+    return None
+
+
+def get_cache():
+    # created on first use so tests can change CACHE_BACKEND after import
+    extensions = current_app.extensions
+    if 'cache' not in extensions:
+        extensions['cache'] = make_cache(current_app.config)
+    return extensions['cache']
+
+
+def invalidate(*tags):
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate(*tags, hold=replicas.lag_window())
+
+
+def fillable(cache, tags):
+    # with replicas, a request not pinned to the primary read from one, and
+    # may have missed the last invalidation's write
+    return not replicas.lag_window() or not cache.held(tags)
+
+
+def remember(key, tags, build, ttl=None):
+    '''
+    Returns the cached value for key, or builds, caches and returns it.
+    '''
+    cache = get_cache()
+    if cache is None or replicas.on_primary():
+        return build()
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        if fillable(cache, tags):
+            cache.set(key, value, tags, ttl)
+    return value
+
+
+def cached_page(tags):
+    '''
+    Caches a GET view's 200 responses by path and query string. tags is
+    called with the view's arguments and returns the entry's tags. Pages
+    are rendered fresh while the session holds flashed messages, since
+    those are part of the page, and while the client is pinned to the
+    primary.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if (cache is None or request.method != 'GET' or '_flashes' in session
+                    or replicas.on_primary()):
+                return view(*args, **kwargs)
+            key = 'page:' + request.full_path
+            hit = cache.get(key)
+            if hit is not None:
+                body, mimetype = hit
+                return Response(body, mimetype=mimetype, headers={'X-Cache': 'HIT'})
+            response = make_response(view(*args, **kwargs))
+            entry_tags = tags(*args, **kwargs)
+            if response.status_code == 200 and fillable(cache, entry_tags):
+                cache.set(key, (response.get_data(), response.mimetype), entry_tags)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
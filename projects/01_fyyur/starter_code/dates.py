@@ -0,0 +1,68 @@
+#----------------------------------------------------------------------------#
+# Date/time formatting for templates.
+#
+# format_datetime() backs the Jinja `datetime` filter. It takes datetime
+# objects as they come from the database (strings are still parsed, for old
+# callers) and formats them with a babel pattern compiled once per
+# (format, locale). format_datetimes() formats a whole column of timestamps,
+# formatting each distinct value once.
+#
+# babel and dateutil are imported on first use to keep them off the startup
+# path.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timezone
+from functools import lru_cache
+
+# named formats accepted by the filter; anything else is a babel pattern
+PATTERNS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def formatter(format='medium', locale=None):
+    '''
+    Returns a function formatting one datetime with the given named format
+    or babel pattern, in locale (default: the system time locale).
+    '''
+    from babel import Locale
+    from babel.dates import LC_TIME, parse_pattern
+
+    pattern = parse_pattern(PATTERNS.get(format, format))
+    locale = Locale.parse(locale or LC_TIME)
+
+    def apply(value):
+        if isinstance(value, str):
+            value = parse(value)
+        if value.tzinfo is None:
+            # what babel.dates.format_datetime does with naive values
+            value = value.replace(tzinfo=timezone.utc)
+        return pattern.apply(value, locale)
+    return apply
+
+
+def parse(value):
+    import dateutil.parser
+    return dateutil.parser.parse(value)
+
+
+def format_datetime(value, format='medium', locale=None):
+    return formatter(format, locale)(value)
+
+
+def format_datetimes(values, format='medium', locale=None):
+    '''
+    Formats a sequence of datetimes, returning a list of strings in the same
+    order. Repeated timestamps are formatted once.
+    '''
+    apply = formatter(format, locale)
+    seen = {}
+    labels = []
+    for value in values:
+        label = seen.get(value)
+        if label is None:
+            label = seen[value] = apply(value)
+        labels.append(label)
+    return labels
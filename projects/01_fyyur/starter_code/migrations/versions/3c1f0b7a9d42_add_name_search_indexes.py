@@ -0,0 +1,37 @@
+"""Add name search indexes
+
+Revision ID: 3c1f0b7a9d42
+Revises: 5ee5fca174e1
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f0b7a9d42'
+down_revision = '5ee5fca174e1'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist')
+
+
+def upgrade():
+    # pg_trgm indexes only exist on PostgreSQL; other databases use the
+    # in-process NgramSearchBackend instead.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        op.create_index(
+            'ix_{}_name_trgm'.format(table), table, ['name'],
+            postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.drop_index('ix_{}_name_trgm'.format(table), table_name=table)
@@ -0,0 +1,105 @@
+"""Normalize genres
+
+Moves the comma-joined Venue.genres and Artist.genres strings into a Genre
+table with venue_genres/artist_genres association tables.
+
+Revision ID: a7c93e15d2b8
+Revises: 8d2e4c61b0f7
+Create Date: 2026-10-18 11:48:05.630214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c93e15d2b8'
+down_revision = '8d2e4c61b0f7'
+branch_labels = None
+depends_on = None
+
+# (owner table, association table, owner key column)
+OWNERS = (
+    ('Venue', 'venue_genres', 'venue_id'),
+    ('Artist', 'artist_genres', 'artist_id'),
+)
+
+
+def split_genres(value):
+    return list(dict.fromkeys(g.strip() for g in (value or '').split(',') if g.strip()))
+
+
+def upgrade():
+    op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for owner, association, key in OWNERS:
+        op.create_table(association,
+        sa.Column(key, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([key], [owner + '.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(key, 'genre_id')
+        )
+        op.create_index('ix_{}_genre_id_{}'.format(association, key), association,
+                        ['genre_id', key], unique=False)
+
+    # ### data migration ###
+    bind = op.get_bind()
+    genre = sa.table('Genre', sa.column('id'), sa.column('name'))
+    links = {}
+    names = {}
+    for owner, association, key in OWNERS:
+        rows = bind.execute(sa.select([sa.column('id'), sa.column('genres')])
+                            .select_from(sa.table(owner))).fetchall()
+        links[owner] = [(row_id, name) for row_id, value in rows
+                        for name in split_genres(value)]
+        for _, name in links[owner]:
+            names.setdefault(name, len(names) + 1)
+    if names:
+        op.bulk_insert(genre, [{'id': genre_id, 'name': name}
+                               for name, genre_id in names.items()])
+    for owner, association, key in OWNERS:
+        if links[owner]:
+            op.bulk_insert(
+                sa.table(association, sa.column(key), sa.column('genre_id')),
+                [{key: row_id, 'genre_id': names[name]} for row_id, name in links[owner]])
+    if names and bind.dialect.name == 'postgresql':
+        # ids were assigned above; move the serial past them
+        op.execute("SELECT setval(pg_get_serial_sequence('\"Genre\"', 'id'), "
+                   "(SELECT max(id) FROM \"Genre\"))")
+
+    for owner, _, _ in OWNERS:
+        with op.batch_alter_table(owner) as batch_op:
+            batch_op.drop_column('genres')
+
+
+def downgrade():
+    op.add_column('Venue', sa.Column('genres', sa.String(length=120), nullable=True))
+    op.add_column('Artist', sa.Column('genres', sa.String(length=120), nullable=True))
+
+    # ### data migration ###
+    bind = op.get_bind()
+    for owner, association, key in OWNERS:
+        rows = bind.execute(sa.text(
+            'SELECT a.{key}, g.name FROM {association} a '
+            'JOIN "Genre" g ON g.id = a.genre_id ORDER BY a.{key}, g.name'.format(
+                key=key, association=association))).fetchall()
+        genres = {}
+        for row_id, name in rows:
+            genres.setdefault(row_id, []).append(name)
+        owner_table = sa.table(owner, sa.column('id'), sa.column('genres'))
+        for row_id, names in genres.items():
+            bind.execute(owner_table.update().where(owner_table.c.id == row_id)
+                         .values(genres=','.join(names)))
+
+    op.execute('UPDATE "Venue" SET genres = \'\' WHERE genres IS NULL')
+    with op.batch_alter_table('Venue') as batch_op:
+        batch_op.alter_column('genres', existing_type=sa.String(length=120), nullable=False)
+    for _, association, key in reversed(OWNERS):
+        op.drop_index('ix_{}_genre_id_{}'.format(association, key), table_name=association)
+        op.drop_table(association)
+    op.drop_table('Genre')
@@ -0,0 +1,33 @@
+"""Add BRIN index on Show.start_time
+
+Revision ID: f2a8c5d3e614
+Revises: e5b20f9c8a17
+Create Date: 2026-10-18 18:40:12.518903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a8c5d3e614'
+down_revision = 'e5b20f9c8a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Shows are mostly inserted in start_time order, so a BRIN index (a few
+    # pages for millions of rows) lets wide calendar windows skip whole
+    # blocks. Narrow windows and keyset paging keep using the B-tree
+    # ix_Show_start_time_id. Other databases only get the B-tree.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.create_index('ix_Show_start_time_brin', 'Show', ['start_time'],
+                    postgresql_using='brin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_Show_start_time_brin', table_name='Show')
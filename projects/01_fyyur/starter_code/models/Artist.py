@@ -1,16 +1,38 @@
+from . import db
+from .Genre import artist_genres
+
+
 class Artist(db.Model):
     __tablename__ = 'Artist'
-
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    # loaded with one IN query for however many rows were fetched
+    genres = db.relationship('Genre', secondary=artist_genres, lazy='selectin', order_by='Genre.name')
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     webpage_link = db.Column(db.String(500))
-    seeking_venue = db.Column(db.Boolean(),nullable = False, default = False)
-    description = db.Column(db.String(500), nullable = True)
-    shows = db.relationship('Venue',secondary = Show, backref = db.backref('Artist',lazy = False))
-    #add shows (artist has many shows)
\ No newline at end of file
+    description = db.Column(db.String(500), nullable=True)
+    seeking_venue = db.Column(db.Boolean(), nullable=False, default=False)
+    # maintained by show_counts.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship('Venue', secondary='Show')
+
+    def dictionary(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'city': self.city,
+            'state': self.state,
+            'phone': self.phone,
+            'genres': [genre.name for genre in self.genres],
+            'image_link': self.image_link,
+            'facebook_link': self.facebook_link,
+            'webpage_link': self.webpage_link,
+            'seeking_venue': self.seeking_venue,
+            'seeking_description': self.description,
+        }
+        # add shows (artist has many shows)
@@ -0,0 +1,9 @@
+from . import db
+
+
+class DataVersion(db.Model):
+    # one row per listing ('venues', 'artists', 'shows'), bumped by
+    # versions.py whenever a write changes what the listing returns
+    __tablename__ = 'DataVersion'
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -1,6 +1,40 @@
+from datetime import datetime, timedelta
+
+from . import db
+
+# minutes; bounding show length lets schedule.py find every show that can
+# overlap a time slot from the shows starting at most this long before it
+DEFAULT_DURATION = 120
+MAX_DURATION = 24 * 60
+
+
 class Show(db.Model):
-  __tablename__ = 'Show'
-  id = db.Column(db.Integer, primary_key=True)
-  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'))
-  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'))
-  start_time = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    __tablename__ = 'Show'
+    __table_args__ = (
+        # venue/artist timelines and upcoming counts filter on the owner
+        # plus a start_time range; /shows pages on (start_time, id)
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        db.CheckConstraint('duration > 0 AND duration <= %d' % MAX_DURATION,
+                           name='ck_Show_duration'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'))
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'))
+    start_time = db.Column(db.DateTime, default=datetime.utcnow)
+    duration = db.Column(db.Integer, nullable=False, default=DEFAULT_DURATION,
+                         server_default=str(DEFAULT_DURATION))
+
+    @property
+    def end_time(self):
+        return self.start_time + timedelta(minutes=self.duration or DEFAULT_DURATION)
+
+    def dictionary(self):
+        return {
+            'id': self.id,
+            'venue_id': self.venue_id,
+            'artist_id': self.artist_id,
+            'start_time': self.start_time,
+            'duration': self.duration
+        }
@@ -1,6 +1,13 @@
+from . import db
+from .Genre import venue_genres
+
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        # /venues groups by area
+        db.Index('ix_Venue_state_city', 'state', 'city'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
@@ -10,7 +17,28 @@ class Venue(db.Model):
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     webpage_link = db.Column(db.String(500))
-    seeking_talent = db.Column(db.Boolean(),nullable = False, default = False)
-    description = db.Column(db.String(500), nullable = True)
-    shows = db.relationship('Artist',secondary = Show, backref =db.backref('Venue',lazy = False))
-    #add shows (venue has many shows)
\ No newline at end of file
+    # loaded with one IN query for however many rows were fetched
+    genres = db.relationship('Genre', secondary=venue_genres, lazy='selectin', order_by='Genre.name')
+    description = db.Column(db.String(500), nullable=True)
+    seeking_talent = db.Column(db.Boolean(), nullable=False, default=False)
+    # maintained by show_counts.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship('Artist', secondary='Show')
+
+    def dictionary(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'city': self.city,
+            'state': self.state,
+            'address':self.address,
+            'phone': self.phone,
+            'genres': [genre.name for genre in self.genres],
+            'image_link': self.image_link,
+            'facebook_link': self.facebook_link,
+            'webpage_link': self.webpage_link,
+            'seeking_talent': self.seeking_talent,
+            'seeking_description': self.description,
+        }
+        # add shows (venue has many shows)
@@ -0,0 +1,11 @@
+from replicas import RoutingSQLAlchemy
+
+# a Flask-SQLAlchemy instance whose session reads from replicas on GET
+# requests (see replicas.py)
+db = RoutingSQLAlchemy()
+
+from .Genre import Genre
+from .Show import Show
+from .Venue import Venue
+from .Artist import Artist
+from .DataVersion import DataVersion
@@ -0,0 +1,60 @@
+#----------------------------------------------------------------------------#
+# Concurrent page queries.
+#
+# A detail page reads the entity, its genres and its shows with independent
+# queries. gather() runs them at once when PAGE_QUERY_WORKERS > 0: each call
+# runs on a worker thread in a copy of the request context, with a session
+# and pooled connection of its own, so the page waits for the slowest query
+# instead of their sum. With PAGE_QUERY_WORKERS = 0 the calls run one after
+# another in the request's session, exactly as before.
+#
+# Workers share the request's g, so the query profiler counts their queries
+# against the view's budget and replicas.py keeps them on the replica the
+# request reads from.
+#
+# Flask 1.1 has no async views and SQLAlchemy 1.3 no asyncio engine, so this
+# uses threads; the database driver releases the GIL while it waits.
+#----------------------------------------------------------------------------#
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import _request_ctx_stack, current_app, g, has_request_context
+
+# set on worker threads, where gather() runs calls inline rather than wait
+# on the pool it is running in
+worker = threading.local()
+
+
+def gather(*calls):
+    '''
+    Calls each zero-argument function and returns their results in order,
+    concurrently when the app has page query workers.
+    '''
+    executor = current_app.extensions.get('page_executor')
+    if executor is None or len(calls) < 2 or not has_request_context() \
+            or getattr(worker, 'active', False):
+        return [call() for call in calls]
+    context = _request_ctx_stack.top
+    state = dict(vars(g))
+    futures = [executor.submit(run, context.copy(), state, call) for call in calls]
+    return [future.result() for future in futures]
+
+
+def run(context, state, call):
+    # popping the copied context ends the worker's session and returns its
+    # connection to the pool
+    with context:
+        vars(g).update(state)
+        worker.active = True
+        try:
+            return call()
+        finally:
+            worker.active = False
+
+
+def init_app(app):
+    workers = app.config['PAGE_QUERY_WORKERS']
+    if workers:
+        app.extensions['page_executor'] = ThreadPoolExecutor(
+            workers, thread_name_prefix='page-queries')
@@ -0,0 +1,130 @@
+#----------------------------------------------------------------------------#
+# Per-request SQL profiling.
+#
+# With QUERY_PROFILER on, every statement a request sends to the database is
+# counted and timed through SQLAlchemy's cursor events. The totals go out in a
+# Server-Timing header. A statement repeated QUERY_REPEAT_THRESHOLD or more
+# times with different parameters is the shape of an N+1 loop; it is logged
+# and counted in an X-Query-Repeats header.
+#
+# Views declare how many queries they may issue with @query_budget(n), and
+# QUERY_BUDGETS ({endpoint: n}) overrides that from the config. Over budget,
+# a warning is logged, or QueryBudgetExceeded is raised when
+# QUERY_BUDGET_RAISE is set, which is how the tests fail on a regression.
+#
+# Only queries issued before the response is returned are seen; the bodies of
+# streamed responses are read afterwards.
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryProfile(object):
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+        # parallel.gather() workers record into their request's profile
+        self.lock = threading.Lock()
+
+    def record(self, statement, seconds):
+        with self.lock:
+            self.count += 1
+            self.seconds += seconds
+            self.statements[statement] += 1
+
+    def repeated(self, threshold):
+        '''
+        [(statement, times)] for the statements run at least threshold times,
+        most repeated first.
+        '''
+        return [(statement, times) for statement, times in self.statements.most_common()
+                if times >= threshold]
+
+    def server_timing(self):
+        return 'db;dur=%.1f;desc="%d queries"' % (self.seconds * 1000, self.count)
+
+
+def query_budget(limit):
+    '''
+    Marks a view as issuing at most limit queries per request.
+    '''
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def budget_for(endpoint):
+    budgets = current_app.config.get('QUERY_BUDGETS') or {}
+    if endpoint in budgets:
+        return budgets[endpoint]
+    view = current_app.view_functions.get(endpoint)
+    return getattr(view, 'query_budget', None)
+
+
+#  Engine hooks
+#  ----------------------------------------------------------------
+
+def current_profile():
+    return g.get('query_profile') if has_request_context() else None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile()
+    started = conn.info.get('query_started')
+    if profile is not None and started:
+        profile.record(statement, time.perf_counter() - started.pop())
+
+
+#  Request hooks
+#  ----------------------------------------------------------------
+
+def start_profile():
+    g.query_profile = QueryProfile()
+
+
+def finish_profile(response):
+    profile = g.pop('query_profile', None)
+    if profile is None:
+        return response
+    response.headers.add('Server-Timing', profile.server_timing())
+
+    repeated = profile.repeated(current_app.config['QUERY_REPEAT_THRESHOLD'])
+    if repeated:
+        response.headers['X-Query-Repeats'] = str(len(repeated))
+        for statement, times in repeated:
+            current_app.logger.warning('possible N+1 in %s: %d x %s',
+                                       request.endpoint, times, ' '.join(statement.split()))
+
+    budget = budget_for(request.endpoint)
+    if budget is not None and profile.count > budget:
+        message = '%s issued %d queries, budget is %d' % (request.endpoint, profile.count, budget)
+        if current_app.config['QUERY_BUDGET_RAISE']:
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+    return response
+
+
+def init_app(app):
+    if app.config['QUERY_PROFILER']:
+        app.before_request(start_profile)
+        app.after_request(finish_profile)
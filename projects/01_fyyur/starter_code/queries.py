@@ -0,0 +1,323 @@
+#----------------------------------------------------------------------------#
+# Data access.
+#
+# Read helpers for the Fyyur views. Each helper issues a fixed number of
+# queries regardless of how many rows it returns, and hands back data already
+# shaped for the template that renders it.
+#----------------------------------------------------------------------------#
+
+import base64
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import tuple_
+
+from models import db, Genre, Show, Venue, Artist
+from models.Genre import venue_genres, artist_genres
+import search as search_backend
+from show_counts import is_upcoming
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+def venue_areas(genre=None):
+    '''
+    Builds the city/state -> venues -> num_upcoming_shows tree rendered by
+    pages/venues.html from a single query, optionally limited to the venues
+    of one genre. Counts are the maintained Venue.upcoming_shows_count.
+    '''
+    query = db.session.query(
+        Venue.state, Venue.city, Venue.id, Venue.name, Venue.upcoming_shows_count)
+    if genre is not None:
+        query = query.filter(
+            Venue.id.in_(genre_members(venue_genres, venue_genres.c.venue_id, genre)))
+    rows = query.order_by(Venue.state, Venue.city, Venue.id).all()
+
+    areas = []
+    for state, city, venue_id, name, num_upcoming_shows in rows:
+        if not areas or areas[-1]['state'] != state or areas[-1]['city'] != city:
+            areas.append({
+                'state': state,
+                'city': city,
+                'venues': []
+            })
+        areas[-1]['venues'].append({
+            'id': venue_id,
+            'name': name,
+            'num_upcoming_shows': num_upcoming_shows
+        })
+    return areas
+
+
+#  Show timelines
+#  ----------------------------------------------------------------
+
+def show_timeline(rows, now, counterpart):
+    '''
+    Splits (start_time, id, name, image_link) rows into the upcoming/past
+    lists and counts used by the venue and artist detail pages, in one pass.
+    start_time stays a datetime for the template's datetime filter.
+    counterpart names the other side of the show, i.e. 'artist' or 'venue'.
+    '''
+    timeline = {'upcoming_shows': [], 'past_shows': []}
+    for start_time, counterpart_id, name, image_link in rows:
+        key = 'upcoming_shows' if is_upcoming(start_time, now) else 'past_shows'
+        timeline[key].append({
+            counterpart + '_id': counterpart_id,
+            counterpart + '_name': name,
+            counterpart + '_image_link': image_link,
+            'start_time': start_time
+        })
+    timeline['upcoming_shows_count'] = len(timeline['upcoming_shows'])
+    timeline['past_shows_count'] = len(timeline['past_shows'])
+    return timeline
+
+
+def venue_shows(venue_id, now=None):
+    '''
+    Shows at a venue joined with the performing artist, split into past and
+    upcoming.
+    '''
+    rows = db.session.query(
+        Show.start_time, Artist.id, Artist.name, Artist.image_link
+    ).join(Artist, Show.artist_id == Artist.id).filter(
+        Show.venue_id == venue_id
+    ).order_by(Show.start_time).all()
+    return show_timeline(rows, now or datetime.today(), 'artist')
+
+
+def artist_shows(artist_id, now=None):
+    '''
+    Shows by an artist joined with the hosting venue, split into past and
+    upcoming.
+    '''
+    rows = db.session.query(
+        Show.start_time, Venue.id, Venue.name, Venue.image_link
+    ).join(Venue, Show.venue_id == Venue.id).filter(
+        Show.artist_id == artist_id
+    ).order_by(Show.start_time).all()
+    return show_timeline(rows, now or datetime.today(), 'venue')
+
+
+#  Search
+#  ----------------------------------------------------------------
+
+def search(model, term, limit=None, offset=0):
+    '''
+    Case-insensitive partial name search over Venue or Artist.
+
+    The search backend picks and ranks the page of matching ids; their names
+    and maintained upcoming show counts then come from one query by id.
+    '''
+    total, ids = search_backend.get_backend().search(model, term, limit, offset)
+    if not ids:
+        return {'count': total, 'data': []}
+
+    rows = db.session.query(
+        model.id, model.name, model.upcoming_shows_count
+    ).filter(model.id.in_(ids)).all()
+
+    by_id = {row[0]: row for row in rows}
+    return {
+        'count': total,
+        'data': [{
+            'id': entity_id,
+            'name': by_id[entity_id][1],
+            'num_upcoming_shows': by_id[entity_id][2]
+        } for entity_id in ids if entity_id in by_id]
+    }
+
+
+def search_venues(term, limit=None, offset=0):
+    return search(Venue, term, limit, offset)
+
+
+def search_artists(term, limit=None, offset=0):
+    return search(Artist, term, limit, offset)
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+def encode_cursor(start_time, show_id):
+    raw = '{}|{}'.format(start_time.isoformat(), show_id)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    '''
+    Returns the (start_time, id) a cursor points after. Raises ValueError for
+    anything encode_cursor() did not produce.
+    '''
+    start_time, show_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(start_time), int(show_id)
+
+
+def show_page(cursor=None, limit=30, start=None, end=None, city=None, state=None,
+              genre=None):
+    '''
+    One page of the /shows listing ordered by (start_time, id), joined with
+    the venue and artist columns the page renders. Paging is by keyset: the
+    returned next_cursor marks the last row, and is None on the last page.
+
+    start/end limit the page to shows starting in [start, end); city and
+    state to shows at venues there; genre to shows by artists of that genre.
+    Every filter is part of the one query, and the start_time range walks
+    the (start_time, id) index.
+    '''
+    query = db.session.query(
+        Show.id, Show.start_time,
+        Venue.id, Venue.name,
+        Artist.id, Artist.name, Artist.image_link
+    ).join(Venue, Show.venue_id == Venue.id).join(
+        Artist, Show.artist_id == Artist.id)
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    if state is not None:
+        query = query.filter(Venue.state == state)
+    if city is not None:
+        query = query.filter(Venue.city == city)
+    if genre is not None:
+        query = query.filter(
+            Show.artist_id.in_(genre_members(artist_genres, artist_genres.c.artist_id, genre)))
+    if cursor is not None:
+        query = query.filter(
+            tuple_(Show.start_time, Show.id) > tuple_(*decode_cursor(cursor)))
+    # one extra row tells whether there is a next page
+    rows = query.order_by(Show.start_time, Show.id).limit(limit + 1).all()
+
+    shows = [{
+        'id': show_id,
+        'venue_id': venue_id,
+        'venue_name': venue_name,
+        'artist_id': artist_id,
+        'artist_name': artist_name,
+        'artist_image_link': artist_image_link,
+        'start_time': start_time
+    } for (show_id, start_time, venue_id, venue_name,
+           artist_id, artist_name, artist_image_link) in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0])
+    return shows, next_cursor
+
+
+#  Genres
+#  ----------------------------------------------------------------
+
+def genre_members(association, member_id, genre):
+    # ids of model rows tagged genre; walks Genre.name's unique index and the
+    # association's (genre_id, member_id) index
+    return db.session.query(member_id).join(
+        Genre, Genre.id == association.c.genre_id
+    ).filter(Genre.name == genre)
+
+
+def venue_list(genre=None, limit=None, offset=0):
+    '''
+    Venue ids and names ordered by name, optionally only those of one genre.
+    '''
+    query = db.session.query(Venue.id, Venue.name)
+    if genre is not None:
+        query = query.filter(
+            Venue.id.in_(genre_members(venue_genres, venue_genres.c.venue_id, genre)))
+    return [{'id': venue_id, 'name': name} for venue_id, name in
+            query.order_by(Venue.name, Venue.id).limit(limit).offset(offset)]
+
+
+def artist_list(genre=None, limit=None, offset=0):
+    '''
+    Artist ids and names ordered by name, optionally only those of one genre.
+    '''
+    query = db.session.query(Artist.id, Artist.name)
+    if genre is not None:
+        query = query.filter(
+            Artist.id.in_(genre_members(artist_genres, artist_genres.c.artist_id, genre)))
+    return [{'id': artist_id, 'name': name} for artist_id, name in
+            query.order_by(Artist.name, Artist.id).limit(limit).offset(offset)]
+
+
+#  Streaming listings
+#  ----------------------------------------------------------------
+
+# rows fetched per round trip by the stream_* helpers
+STREAM_CHUNK_SIZE = 1000
+
+
+def chunks(query, size):
+    # lists of up to size rows, read through a server-side cursor
+    rows = iter(query.yield_per(size))
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def genres_of(association, member_id, ids):
+    # {id: [genre names]} for a chunk of venue or artist ids
+    genres = {row_id: [] for row_id in ids}
+    for row_id, name in db.session.query(member_id, Genre.name).join(
+            Genre, Genre.id == association.c.genre_id
+    ).filter(member_id.in_(ids)).order_by(member_id, Genre.name):
+        genres[row_id].append(name)
+    return genres
+
+
+def stream_members(model, association, member_id, columns, genre=None,
+                   chunk_size=STREAM_CHUNK_SIZE):
+    query = db.session.query(*columns)
+    if genre is not None:
+        query = query.filter(model.id.in_(genre_members(association, member_id, genre)))
+    for chunk in chunks(query.order_by(model.id), chunk_size):
+        genres = genres_of(association, member_id, [row.id for row in chunk])
+        for row in chunk:
+            yield dict(row._asdict(), genres=genres[row.id])
+
+
+def stream_venues(genre=None, chunk_size=STREAM_CHUNK_SIZE):
+    '''
+    Yields every venue (optionally only those of one genre) as a dict, in id
+    order, holding at most chunk_size rows at a time. Two queries per chunk.
+    '''
+    return stream_members(Venue, venue_genres, venue_genres.c.venue_id, (
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.phone,
+        Venue.image_link, Venue.facebook_link, Venue.webpage_link, Venue.seeking_talent,
+        Venue.description.label('seeking_description'),
+        Venue.upcoming_shows_count, Venue.past_shows_count
+    ), genre, chunk_size)
+
+
+def stream_artists(genre=None, chunk_size=STREAM_CHUNK_SIZE):
+    '''
+    Yields every artist (optionally only those of one genre) as a dict, in id
+    order, holding at most chunk_size rows at a time. Two queries per chunk.
+    '''
+    return stream_members(Artist, artist_genres, artist_genres.c.artist_id, (
+        Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+        Artist.image_link, Artist.facebook_link, Artist.webpage_link, Artist.seeking_venue,
+        Artist.description.label('seeking_description'),
+        Artist.upcoming_shows_count, Artist.past_shows_count
+    ), genre, chunk_size)
+
+
+def stream_shows(chunk_size=STREAM_CHUNK_SIZE):
+    '''
+    Yields every show with its venue and artist names as a dict, ordered by
+    (start_time, id), holding at most chunk_size rows at a time.
+    '''
+    query = db.session.query(
+        Show.id, Show.start_time,
+        Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+        Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id).join(
+        Artist, Show.artist_id == Artist.id).order_by(Show.start_time, Show.id)
+    for chunk in chunks(query, chunk_size):
+        for row in chunk:
+            show = row._asdict()
+            show['start_time'] = show['start_time'].isoformat()
+            yield show
@@ -0,0 +1,121 @@
+#----------------------------------------------------------------------------#
+# Read models.
+#
+# Read-only views of venues, artists and shows as namedtuple rows. Rows are
+# built from the columns a page needs, with no ORM instance, identity-map
+# entry or change tracking behind them. Their dictionary() returns the same
+# dict as the model's, so they can stand in for a model wherever one is only
+# read.
+#
+# The *_rows() helpers take a list of ids (None for every row) and cost two
+# queries however many rows come back: one for the columns, one for the
+# genres.
+#----------------------------------------------------------------------------#
+
+from collections import namedtuple
+
+from models import db, Show, Venue, Artist
+from models.Genre import venue_genres, artist_genres
+from queries import genres_of
+
+
+class VenueRow(namedtuple('VenueRow', (
+        'id', 'name', 'city', 'state', 'address', 'phone', 'image_link',
+        'facebook_link', 'webpage_link', 'seeking_talent', 'description', 'genres'))):
+    __slots__ = ()
+
+    def dictionary(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'city': self.city,
+            'state': self.state,
+            'address': self.address,
+            'phone': self.phone,
+            'genres': self.genres,
+            'image_link': self.image_link,
+            'facebook_link': self.facebook_link,
+            'webpage_link': self.webpage_link,
+            'seeking_talent': self.seeking_talent,
+            'seeking_description': self.description,
+        }
+
+
+class ArtistRow(namedtuple('ArtistRow', (
+        'id', 'name', 'city', 'state', 'phone', 'image_link', 'facebook_link',
+        'webpage_link', 'seeking_venue', 'description', 'genres'))):
+    __slots__ = ()
+
+    def dictionary(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'city': self.city,
+            'state': self.state,
+            'phone': self.phone,
+            'genres': self.genres,
+            'image_link': self.image_link,
+            'facebook_link': self.facebook_link,
+            'webpage_link': self.webpage_link,
+            'seeking_venue': self.seeking_venue,
+            'seeking_description': self.description,
+        }
+
+
+class ShowRow(namedtuple('ShowRow', ('id', 'venue_id', 'artist_id', 'start_time', 'duration'))):
+    __slots__ = ()
+
+    def dictionary(self):
+        return self._asdict()
+
+
+def member_rows(row_class, model, association, member_id, ids, genres=True):
+    # the columns are the row's fields up to genres, named alike on the model;
+    # with genres=False the rows' genres are None and cost no query
+    columns = [getattr(model, field) for field in row_class._fields[:-1]]
+    query = db.session.query(*columns)
+    if ids is not None:
+        if not ids:
+            return []
+        query = query.filter(model.id.in_(ids))
+    rows = query.order_by(model.id).all()
+    if not genres:
+        return [row_class(*row, None) for row in rows]
+    genres = genres_of(association, member_id, [row[0] for row in rows])
+    return [row_class(*row, genres[row[0]]) for row in rows]
+
+
+def venue_rows(ids=None, genres=True):
+    return member_rows(VenueRow, Venue, venue_genres, venue_genres.c.venue_id, ids, genres)
+
+
+def artist_rows(ids=None, genres=True):
+    return member_rows(ArtistRow, Artist, artist_genres, artist_genres.c.artist_id, ids, genres)
+
+
+def venue_genres_of(venue_id):
+    return genres_of(venue_genres, venue_genres.c.venue_id, [venue_id])[venue_id]
+
+
+def artist_genres_of(artist_id):
+    return genres_of(artist_genres, artist_genres.c.artist_id, [artist_id])[artist_id]
+
+
+def show_rows(ids=None):
+    query = db.session.query(Show.id, Show.venue_id, Show.artist_id, Show.start_time,
+                             Show.duration)
+    if ids is not None:
+        query = query.filter(Show.id.in_(ids))
+    return [ShowRow(*row) for row in query.order_by(Show.id)]
+
+
+def venue(venue_id, genres=True):
+    '''The VenueRow of venue_id, or None.'''
+    rows = venue_rows([venue_id], genres)
+    return rows[0] if rows else None
+
+
+def artist(artist_id, genres=True):
+    '''The ArtistRow of artist_id, or None.'''
+    rows = artist_rows([artist_id], genres)
+    return rows[0] if rows else None
@@ -0,0 +1,155 @@
+#----------------------------------------------------------------------------#
+# Read-replica routing.
+#
+# With SQLALCHEMY_REPLICA_URIS set, the queries of GET (and HEAD) requests go
+# to one of the replicas, picked per request so that a page is read from one
+# snapshot. Everything else goes to the primary:
+#
+#   - other methods, commands and code outside a request;
+#   - a GET request from its first flush on (before_flush below), or from
+#     its first write through a connection (before_cursor_execute), which
+#     itself goes wherever the session was already reading;
+#   - a client's requests for REPLICA_STICKY_SECONDS after it wrote, so it
+#     reads its own writes however far the replicas lag (the deadline is
+#     kept in the Flask session cookie, which every process must be able to
+#     read: init_app requires a configured SECRET_KEY);
+#   - models with a __bind_key__ of their own.
+#
+# Replicas are Flask-SQLAlchemy binds named replica:0, replica:1, ... and use
+# the primary's engine options. Nothing here copies data to them; that is the
+# database's replication (or, for local testing, two SQLite files or
+# in-memory databases filled by hand).
+#----------------------------------------------------------------------------#
+
+import random
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.engine import Engine
+
+READ_METHODS = ('GET', 'HEAD')
+
+# the statements that change data; anything else (SELECT, SAVEPOINT, ...) reads
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'COPY', 'TRUNCATE', 'CREATE', 'ALTER',
+                    'DROP')
+
+
+class RoutingSession(SignallingSession):
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if mapper is None or not mapper.persist_selectable.info.get('bind_key'):
+            replica = self.replica()
+            if replica is not None:
+                return self.db.get_engine(self.app, bind=replica)
+        return super().get_bind(mapper, clause)
+
+    def replica(self):
+        '''
+        The bind name of the replica this session should read from now, or
+        None for the primary.
+        '''
+        if not has_request_context() or request.method not in READ_METHODS:
+            return None
+        if g.get('db_wrote'):
+            return None
+        replica = g.get('db_replica')
+        if replica is None:
+            binds = self.app.config.get('REPLICA_BINDS') or ()
+            if not binds or time.time() < session.get('db_primary_until', 0):
+                return None
+            replica = g.db_replica = random.choice(binds)
+        return replica
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+        # the factory's session class is a subclass made for it, which
+        # listeners on RoutingSession itself do not reach
+        event.listen(factory, 'before_flush', before_flush)
+        return factory
+
+
+#  Helpers for caches
+#  ----------------------------------------------------------------
+
+def on_primary():
+    '''
+    True when this request's client is pinned to the primary: it has
+    written, in this request or within REPLICA_STICKY_SECONDS.
+    '''
+    if not has_request_context() or not current_app.config.get('REPLICA_BINDS'):
+        return False
+    return bool(g.get('db_wrote')) or time.time() < session.get('db_primary_until', 0)
+
+
+def lag_window():
+    # seconds a replica may lag the primary, as far as stickiness assumes
+    if not current_app.config.get('REPLICA_BINDS'):
+        return 0
+    return current_app.config['REPLICA_STICKY_SECONDS']
+
+
+#  Request hooks
+#  ----------------------------------------------------------------
+
+def start_request():
+    # g can outlive a request (tests push one app context for many), so
+    # reset the routing state
+    g.db_replica = None
+    g.db_wrote = False
+
+
+def wrote():
+    '''
+    Sends the rest of this request, and the client's requests for
+    REPLICA_STICKY_SECONDS, to the primary. The listeners below call it for
+    writes made through SQLAlchemy; call it after writing through a raw
+    DBAPI cursor.
+    '''
+    if has_request_context():
+        g.db_wrote = True
+
+
+def before_flush(db_session, flush_context, instances):
+    # only flushes with changes get here; they and every later statement of
+    # the request go to the primary
+    wrote()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    # Core writes (bulk inserts, counter refreshes, ...) bypass the flush
+    if has_request_context() and statement.lstrip()[:8].upper().startswith(WRITE_STATEMENTS):
+        wrote()
+
+
+def finish_request(response):
+    if g.get('db_wrote'):
+        session['db_primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+
+def init_app(app):
+    uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or ()
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    names = []
+    for i, uri in enumerate(uris):
+        name = 'replica:%d' % i
+        binds[name] = uri
+        names.append(name)
+    app.config['SQLALCHEMY_BINDS'] = binds or None
+    app.config['REPLICA_BINDS'] = tuple(names)
+    if names and not app.config.get('SECRET_KEY'):
+        raise RuntimeError('read replicas need SECRET_KEY set, the same in every '
+                           'process, to keep clients on the primary after writes')
+    if names:
+        app.before_request(start_request)
+        app.after_request(finish_request)
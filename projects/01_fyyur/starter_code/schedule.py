@@ -0,0 +1,303 @@
+#----------------------------------------------------------------------------#
+# Double-booking detection.
+#
+# A venue cannot hold two shows at once, and neither can an artist: a show
+# occupies [start_time, start_time + duration) at both. book() adds a show
+# only if neither slot is taken. Two backends check the slots:
+#
+#   PostgresSchedule -- the ex_Show_venue_time/ex_Show_artist_time exclusion
+#                       constraints (GiST over tsrange, added by the
+#                       9b3e7d1c5a20 migration) reject an overlapping insert;
+#                       safe across processes.
+#   IntervalSchedule -- an in-process IntervalIndex per owner, for SQLite and
+#                       tests, kept current by the ORM listeners below. A
+#                       booking holds its slot in the index from the check
+#                       until its flush, so threads cannot book one slot
+#                       twice.
+#
+# Shows without a start_time occupy no slot.
+#
+# IntervalIndex answers with one bisection per owner: O(log n), plus the few
+# shows starting within MAX_DURATION before the slot ends. bulk.py checks
+# imported shows with an IntervalIndex of its own. find_conflicts() reports
+# overlaps already in the table (`python app.py validate_schedule`).
+#----------------------------------------------------------------------------#
+
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Show
+from models.Show import DEFAULT_DURATION, MAX_DURATION
+
+# the Show columns a show is booked against, and the PostgreSQL exclusion
+# constraint guarding each
+OWNERS = (
+    ('venue_id', 'ex_Show_venue_time'),
+    ('artist_id', 'ex_Show_artist_time'),
+)
+
+
+class ScheduleConflict(Exception):
+
+    def __init__(self, owner, owner_id, show_id=None):
+        self.owner = owner  # 'venue_id' or 'artist_id'
+        self.owner_id = owner_id
+        self.show_id = show_id  # the show in the way, when known
+        super().__init__('%s %s already has a show at that time' % (
+            owner[:-3].capitalize(), owner_id))
+
+
+class IntervalIndex(object):
+    '''
+    Half-open intervals [start, end) grouped by key, each list kept sorted by
+    start. No interval is longer than max_length, so the intervals that can
+    overlap [start, end) are among those starting in (start - max_length,
+    end): one bisection finds that run.
+    '''
+
+    def __init__(self, max_length):
+        self.max_length = max_length
+        # key -> ([starts], [(end, item)]), both in start order
+        self.intervals = {}
+        self.items = {}  # item -> (key, start)
+
+    def add(self, key, start, end, item):
+        self.remove(item)
+        starts, rest = self.intervals.setdefault(key, ([], []))
+        i = bisect_left(starts, start)
+        starts.insert(i, start)
+        rest.insert(i, (end, item))
+        self.items[item] = (key, start)
+
+    def remove(self, item):
+        if item not in self.items:
+            return
+        key, start = self.items.pop(item)
+        starts, rest = self.intervals[key]
+        i = bisect_left(starts, start)
+        while rest[i][1] != item:
+            i += 1
+        del starts[i], rest[i]
+
+    def overlapping(self, key, start, end, ignore=None):
+        '''
+        An item whose interval under key overlaps [start, end), or None.
+        '''
+        if key not in self.intervals:
+            return None
+        starts, rest = self.intervals[key]
+        i = bisect_left(starts, end) - 1
+        earliest = start - self.max_length
+        while i >= 0 and starts[i] > earliest:
+            other_end, item = rest[i]
+            if other_end > start and item != ignore:
+                return item
+            i -= 1
+        return None
+
+
+class ScheduleBackend(object):
+
+    def check(self, show):
+        '''
+        Raises ScheduleConflict if show overlaps another show at its venue
+        or of its artist.
+        '''
+
+    @contextmanager
+    def reserve(self, show):
+        '''
+        check(show), then keeps the slot from other bookings until the
+        block, which should flush show, exits.
+        '''
+        self.check(show)
+        yield
+
+    def invalidate(self):
+        '''
+        Drops anything derived from the Show table. Call after writes that
+        bypass the ORM.
+        '''
+
+
+class PostgresSchedule(ScheduleBackend):
+    # the exclusion constraints do the checking when the show is flushed
+    pass
+
+
+class IntervalSchedule(ScheduleBackend):
+    '''
+    One IntervalIndex of every show, keyed by (owner column, owner id), built
+    from the table on first use. Each worker process holds its own copy, so
+    this is only as safe as a single-process SQLite deployment; the threads
+    of that process share it under lock.
+    '''
+
+    def __init__(self):
+        self.index = None
+        self.dirty = False  # index holds flushed, uncommitted shows
+        self.lock = threading.RLock()
+
+    def load(self):
+        with self.lock:
+            if self.index is None:
+                self.index = IntervalIndex(timedelta(minutes=MAX_DURATION))
+                for show in db.session.query(
+                        Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.duration):
+                    self.updated(show)
+                self.dirty = False
+            return self.index
+
+    def check(self, show):
+        if show.start_time is None:
+            return
+        with self.lock:
+            index = self.load()
+            for owner, _ in OWNERS:
+                owner_id = getattr(show, owner)
+                other = index.overlapping((owner, owner_id), show.start_time, show.end_time,
+                                          ignore=(owner, show.id))
+                if other is not None:
+                    raise ScheduleConflict(owner, owner_id, other[1])
+
+    @contextmanager
+    def reserve(self, show):
+        # the slot is held by a placeholder item until the flush has added
+        # the show itself (or failed); the lock is not held across the
+        # flush, whose listeners take it
+        placeholder = object()
+        with self.lock:
+            self.check(show)
+            index = self.load()
+            if show.start_time is not None:
+                for owner, _ in OWNERS:
+                    index.add((owner, getattr(show, owner)), show.start_time, show.end_time,
+                              (owner, placeholder))
+        try:
+            yield
+        finally:
+            with self.lock:
+                for owner, _ in OWNERS:
+                    index.remove((owner, placeholder))
+
+    def invalidate(self):
+        with self.lock:
+            self.index = None
+            self.dirty = False
+
+    def updated(self, show):
+        with self.lock:
+            if self.index is None:
+                return
+            self.dirty = True
+            for owner, _ in OWNERS:
+                if show.start_time is None:
+                    self.index.remove((owner, show.id))
+                    continue
+                end = show.start_time + timedelta(minutes=show.duration or DEFAULT_DURATION)
+                self.index.add((owner, getattr(show, owner)), show.start_time, end,
+                               (owner, show.id))
+
+    def deleted(self, show_id):
+        with self.lock:
+            if self.index is not None:
+                self.dirty = True
+                for owner, _ in OWNERS:
+                    self.index.remove((owner, show_id))
+
+
+def make_schedule(config):
+    if config['SQLALCHEMY_DATABASE_URI'].startswith('postgres'):
+        return PostgresSchedule()
+    return IntervalSchedule()
+
+
+def get_schedule():
+    # created on first use so tests can swap the database URI after import
+    schedule = current_app.extensions.get('schedule')
+    if schedule is None:
+        schedule = current_app.extensions['schedule'] = make_schedule(current_app.config)
+    return schedule
+
+
+def book(show):
+    '''
+    Adds show to the session and flushes it, raising ScheduleConflict
+    (the session then needs a rollback) if its venue or artist is busy.
+    '''
+    with get_schedule().reserve(show):
+        db.session.add(show)
+        try:
+            db.session.flush()
+        except IntegrityError as error:
+            constraint = getattr(getattr(error.orig, 'diag', None), 'constraint_name', None)
+            for owner, name in OWNERS:
+                if constraint == name:
+                    raise ScheduleConflict(owner, getattr(show, owner)) from error
+            raise
+
+
+def find_conflicts(chunk_size=1000):
+    '''
+    Yields (owner, owner_id, show_id, other_show_id) for every show that
+    starts before an earlier show of the same venue or artist has ended.
+    One pass per owner column over its (owner, start_time) index.
+    '''
+    for owner, _ in OWNERS:
+        column = getattr(Show, owner)
+        current, busiest = None, None  # owner id; (end, show id) ending last
+        for show_id, owner_id, start_time, duration in db.session.query(
+                Show.id, column, Show.start_time, Show.duration
+        ).filter(Show.start_time.isnot(None)
+        ).order_by(column, Show.start_time, Show.id).yield_per(chunk_size):
+            if owner_id != current:
+                current, busiest = owner_id, None
+            elif busiest is not None and start_time < busiest[0]:
+                yield owner, owner_id, show_id, busiest[1]
+            end = start_time + timedelta(minutes=duration)
+            if busiest is None or end > busiest[0]:
+                busiest = (end, show_id)
+
+
+#  Index maintenance
+#  ----------------------------------------------------------------
+
+def interval_schedule():
+    schedule = current_app.extensions.get('schedule') if current_app else None
+    return schedule if isinstance(schedule, IntervalSchedule) else None
+
+
+@event.listens_for(Show, 'after_insert')
+@event.listens_for(Show, 'after_update')
+def after_save(mapper, connection, target):
+    schedule = interval_schedule()
+    if schedule is not None:
+        schedule.updated(target)
+
+
+@event.listens_for(Show, 'after_delete')
+def after_delete(mapper, connection, target):
+    schedule = interval_schedule()
+    if schedule is not None:
+        schedule.deleted(target.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def after_commit(session):
+    schedule = interval_schedule()
+    if schedule is not None:
+        schedule.dirty = False
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def after_rollback(session, previous_transaction):
+    # flushed shows were undone; rebuild from the table on next check
+    schedule = interval_schedule()
+    if schedule is not None and schedule.dirty:
+        schedule.invalidate()
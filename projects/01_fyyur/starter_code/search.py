@@ -0,0 +1,253 @@
+#----------------------------------------------------------------------------#
+# Name search.
+#
+# Venue and Artist searches go through a SearchBackend that returns a ranked
+# page of matching ids. Two backends are provided:
+#
+#   PostgresSearchBackend -- uses the pg_trgm GIN index added by the
+#                            3c1f0b7a9d42 migration.
+#   NgramSearchBackend    -- an in-process n-gram inverted index, used with
+#                            SQLite and in tests.
+#----------------------------------------------------------------------------#
+
+import heapq
+import threading
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import event, func
+
+from models import db, Venue, Artist
+
+SEARCHABLE = (Venue, Artist)
+
+
+class SearchBackend(object):
+
+    def search(self, model, term, limit=None, offset=0):
+        '''
+        Returns (total, ids): the number of rows of model whose name contains
+        term (case-insensitive) and the ids of the requested page of them,
+        best match first.
+        '''
+        raise NotImplementedError
+
+    def invalidate(self, model=None):
+        '''
+        Drops anything the backend derived from the table of model (or of
+        every searchable model). Call after writes that bypass the ORM.
+        '''
+
+
+def escape_like(term):
+    # LIKE wildcards in the term match themselves
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class PostgresSearchBackend(SearchBackend):
+
+    def search(self, model, term, limit=None, offset=0):
+        # a substring match, as NgramSearchBackend's; served by the
+        # gin_trgm_ops index
+        pattern = '%{}%'.format(escape_like(term))
+        rows = db.session.query(model.id, func.count().over()).filter(
+            model.name.ilike(pattern, escape='\\')
+        ).order_by(
+            func.similarity(model.name, term).desc(), model.name, model.id
+        ).limit(limit).offset(offset).all()
+        return (rows[0][1] if rows else 0), [row[0] for row in rows]
+
+
+class NgramIndex(object):
+    '''
+    Inverted index from each n character substring (n-gram) of a lowercased
+    name to the ids of the rows containing it. Terms of at least n characters
+    intersect the postings of their n-grams and verify the candidates; shorter
+    terms union the postings of every n-gram that contains them.
+
+    add() and remove() hold lock; so must a reader for as long as it uses
+    what match() returned (rank() looks the ids up again).
+    '''
+
+    def __init__(self, n=3):
+        self.n = n
+        self.lock = threading.RLock()
+        self.names = {}
+        self.postings = defaultdict(set)
+        # names shorter than n have no n-grams and are checked directly
+        self.short = set()
+
+    def grams(self, text):
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, row_id, name):
+        name = (name or '').lower()
+        with self.lock:
+            self.remove(row_id)
+            self.names[row_id] = name
+            if len(name) < self.n:
+                self.short.add(row_id)
+            for gram in self.grams(name):
+                self.postings[gram].add(row_id)
+
+    def remove(self, row_id):
+        with self.lock:
+            name = self.names.pop(row_id, None)
+            if name is None:
+                return
+            self.short.discard(row_id)
+            for gram in self.grams(name):
+                posting = self.postings[gram]
+                posting.discard(row_id)
+                if not posting:
+                    del self.postings[gram]
+
+    def match(self, term):
+        term = term.lower()
+        with self.lock:
+            if not term:
+                return set(self.names)
+            if len(term) < self.n:
+                matches = {row_id for row_id in self.short if term in self.names[row_id]}
+                for gram, posting in self.postings.items():
+                    if term in gram:
+                        matches |= posting
+                return matches
+            postings = sorted(
+                (self.postings.get(gram, set()) for gram in self.grams(term)), key=len)
+            candidates = postings[0].intersection(*postings[1:])
+            return {row_id for row_id in candidates if term in self.names[row_id]}
+
+    def rank(self, term, ids, limit=None):
+        # prefix matches first, then the shortest (closest) names
+        term = term.lower()
+        names = self.names
+
+        def key(row_id):
+            name = names[row_id]
+            return (not name.startswith(term), len(name), name, row_id)
+        if limit is None:
+            return sorted(ids, key=key)
+        return heapq.nsmallest(limit, ids, key=key)
+
+
+class NgramSearchBackend(SearchBackend):
+    '''
+    Keeps one NgramIndex per searchable model in process memory. An index is
+    built from the table on first use and then kept current by the ORM
+    listeners below, which only see this process's writes: each worker
+    process holds its own copy, stale for rows another process changed
+    until invalidate() or a restart. Safe to share between the threads of
+    a worker.
+    '''
+
+    def __init__(self, n=3):
+        self.n = n
+        self.indexes = {}
+        self.dirty = set()  # models whose index holds flushed, uncommitted rows
+        # held while an index is built, so that no thread builds a second
+        # one and no write lands in an index that is then replaced
+        self.lock = threading.RLock()
+
+    def index(self, model):
+        index = self.indexes.get(model)
+        if index is None:
+            with self.lock:
+                index = self.indexes.get(model)
+                if index is None:
+                    index = NgramIndex(self.n)
+                    for row_id, name in db.session.query(model.id, model.name):
+                        index.add(row_id, name)
+                    self.indexes[model] = index
+        return index
+
+    def search(self, model, term, limit=None, offset=0):
+        index = self.index(model)
+        end = None if limit is None else offset + limit
+        with index.lock:
+            matches = index.match(term)
+            return len(matches), index.rank(term, matches, end)[offset:]
+
+    def invalidate(self, model=None):
+        with self.lock:
+            if model is None:
+                self.indexes.clear()
+                self.dirty.clear()
+            else:
+                self.indexes.pop(model, None)
+                self.dirty.discard(model)
+
+    def updated(self, model, row_id, name):
+        with self.lock:
+            if model in self.indexes:
+                self.dirty.add(model)
+                self.indexes[model].add(row_id, name)
+
+    def deleted(self, model, row_id):
+        with self.lock:
+            if model in self.indexes:
+                self.dirty.add(model)
+                self.indexes[model].remove(row_id)
+
+
+def make_backend(config):
+    '''
+    Picks the backend from SEARCH_BACKEND ('postgresql' or 'ngram'), falling
+    back to the dialect of SQLALCHEMY_DATABASE_URI.
+    '''
+    kind = config.get('SEARCH_BACKEND') or (
+        'postgresql' if config['SQLALCHEMY_DATABASE_URI'].startswith('postgres')
+        else 'ngram')
+    if kind == 'postgresql':
+        return PostgresSearchBackend()
+    return NgramSearchBackend(config.get('SEARCH_NGRAM_SIZE', 3))
+
+
+def get_backend():
+    # created on first use so tests can swap the database URI after import
+    backend = current_app.extensions.get('search')
+    if backend is None:
+        backend = current_app.extensions['search'] = make_backend(current_app.config)
+    return backend
+
+
+#  Index maintenance
+#  ----------------------------------------------------------------
+
+def ngram_backend():
+    backend = current_app.extensions.get('search') if current_app else None
+    return backend if isinstance(backend, NgramSearchBackend) else None
+
+
+def after_save(mapper, connection, target):
+    backend = ngram_backend()
+    if backend is not None:
+        backend.updated(mapper.class_, target.id, target.name)
+
+
+def after_delete(mapper, connection, target):
+    backend = ngram_backend()
+    if backend is not None:
+        backend.deleted(mapper.class_, target.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def after_commit(session):
+    backend = ngram_backend()
+    if backend is not None:
+        backend.dirty.clear()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def after_rollback(session, previous_transaction):
+    # flushed names were undone; rebuild those indexes on next search
+    backend = ngram_backend()
+    if backend is not None:
+        for model in list(backend.dirty):
+            backend.invalidate(model)
+
+
+for searchable in SEARCHABLE:
+    event.listen(searchable, 'after_insert', after_save)
+    event.listen(searchable, 'after_update', after_save)
+    event.listen(searchable, 'after_delete', after_delete)
@@ -0,0 +1,149 @@
+#----------------------------------------------------------------------------#
+# Upcoming/past show counters.
+#
+# Venue and Artist carry upcoming_shows_count and past_shows_count so listing
+# and search pages can read them without counting Show rows. They are kept
+# current three ways:
+#
+#   - on flush, for every venue/artist whose shows were added, moved or
+#     deleted (including the shows removed with a deleted venue/artist);
+#   - by roll_past_shows(), run periodically, for the venues/artists whose
+#     shows have started since the previous run;
+#   - by rebuild_counts(), which recomputes every row.
+#
+# Each refresh recounts the affected rows from Show using the
+# (venue_id, start_time) / (artist_id, start_time) indexes, so running one
+# twice is harmless.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import and_, event, func, inspect, select
+
+from models import db, Show, Venue, Artist
+import versions
+
+# refresh() runs one UPDATE per this many ids
+CHUNK_SIZE = 500
+
+OWNERS = (
+    (Venue, 'venue_id'),
+    (Artist, 'artist_id'),
+)
+
+
+def is_upcoming(start_time, now):
+    '''
+    The one upcoming/past boundary, for datetimes and Show.start_time alike:
+    a show is upcoming until it starts, and past from its start_time on.
+    '''
+    return start_time > now
+
+
+def counts(model, fk, now):
+    '''Correlated (upcoming, past) show counts for a row of model.'''
+    shows, table = Show.__table__, model.__table__
+    owned = shows.c[fk] == table.c.id
+    return tuple(
+        select([func.count()]).where(and_(owned, when)).correlate(table).as_scalar()
+        for when in (is_upcoming(shows.c.start_time, now),
+                     ~is_upcoming(shows.c.start_time, now)))
+
+
+def refresh(connection, venue_ids=None, artist_ids=None, now=None):
+    '''
+    Recounts the shows of the given venues and artists. None means every
+    row; an empty collection means none.
+    '''
+    now = now or datetime.today()
+    if venue_ids is not None and artist_ids is not None and not (venue_ids or artist_ids):
+        return
+    for (model, fk), ids in zip(OWNERS, (venue_ids, artist_ids)):
+        table = model.__table__
+        upcoming, past = counts(model, fk, now)
+        update = table.update().values(upcoming_shows_count=upcoming, past_shows_count=past)
+        if ids is None:
+            connection.execute(update)
+            continue
+        ids = list(ids)
+        for i in range(0, len(ids), CHUNK_SIZE):
+            connection.execute(update.where(table.c.id.in_(ids[i:i + CHUNK_SIZE])))
+    # the counters are part of the venue and artist listings
+    versions.changed(db.session, ('venues', 'artists'))
+
+
+def roll_past_shows(since=None, now=None):
+    '''
+    Moves shows that started in (since, now] from the upcoming to the past
+    counters of their venue and artist. since defaults to SHOW_ROLL_WINDOW
+    hours before now. Returns the number of shows moved.
+    '''
+    now = now or datetime.today()
+    if since is None:
+        since = now - timedelta(hours=current_app.config['SHOW_ROLL_WINDOW'])
+    started = db.session.query(Show.venue_id, Show.artist_id).filter(
+        Show.start_time > since, ~is_upcoming(Show.start_time, now)).all()
+    refresh(db.session.connection(),
+            {venue_id for venue_id, _ in started},
+            {artist_id for _, artist_id in started}, now)
+    db.session.commit()
+    return len(started)
+
+
+def rebuild_counts(now=None):
+    '''
+    Recomputes every counter. Returns the number of venues and artists whose
+    stored counters were wrong.
+    '''
+    now = now or datetime.today()
+    stale = 0
+    for model, fk in OWNERS:
+        upcoming, past = counts(model, fk, now)
+        stale += db.session.query(func.count(model.id)).filter(
+            (model.upcoming_shows_count != upcoming) | (model.past_shows_count != past)
+        ).scalar()
+    refresh(db.session.connection(), now=now)
+    db.session.commit()
+    return stale
+
+
+#  Flush hooks
+#  ----------------------------------------------------------------
+
+def pending(session):
+    return session.info.setdefault('show_counts', {'venue_id': set(), 'artist_id': set()})
+
+
+@event.listens_for(db.session, 'before_flush')
+def collect_changes(session, flush_context, instances):
+    ids = pending(session)
+    for show in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(show, Show):
+            continue
+        for fk in ids:
+            # both the current and, for moved shows, the previous owner
+            history = inspect(show).attrs[fk].history
+            ids[fk].update(value for value in chain(*history) if value is not None)
+    for model, fk in OWNERS:
+        deleted = [obj.id for obj in session.deleted if isinstance(obj, model)]
+        if not deleted:
+            continue
+        # their shows go with them; recount the other side of those shows
+        other = 'artist_id' if fk == 'venue_id' else 'venue_id'
+        with session.no_autoflush:
+            ids[other].update(row[0] for row in session.query(getattr(Show, other)).filter(
+                getattr(Show, fk).in_(deleted)))
+
+
+@event.listens_for(db.session, 'after_flush')
+def apply_changes(session, flush_context):
+    ids = session.info.pop('show_counts', None)
+    if ids and (ids['venue_id'] or ids['artist_id']):
+        refresh(session.connection(), ids['venue_id'], ids['artist_id'])
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def discard_changes(session, previous_transaction):
+    session.info.pop('show_counts', None)
@@ -0,0 +1,816 @@
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask import Flask, g, jsonify
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app import create_app
+from models import db, Genre, Show, Venue, Artist
+import queries
+import bulk
+import read_models
+import replicas
+import show_counts
+import versions
+from cache import MemoryCache
+import dates
+from search import NgramIndex, escape_like, get_backend
+from profiler import QueryBudgetExceeded
+import schedule
+from shared import db_settings
+
+
+@contextmanager
+def count_queries():
+    """Records the (statement, parameters) sent to the database inside the
+    block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def full_scans(statements):
+    """EXPLAINs each recorded statement and returns the plan lines that read
+    a whole table instead of going through an index."""
+    cursor = db.session.connection().connection.cursor()
+    scans = []
+    for statement, parameters in statements:
+        if db.engine.dialect.name == 'postgresql':
+            # only fail when no index could serve the query at all
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + statement, parameters)
+            scans += [row[0] for row in cursor.fetchall() if 'Seq Scan' in row[0]]
+        else:
+            cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            scans += [row[3] for row in cursor.fetchall()
+                      if row[3].startswith('SCAN') and 'INDEX' not in row[3]]
+    return scans
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        self.app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+            'TESTING': True,
+            'CACHE_BACKEND': None,
+            # fail any request that issues more queries than its view allows
+            'QUERY_BUDGET_RAISE': True
+        })
+        self.client = self.app.test_client
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.now = datetime.today()
+
+    def tearDown(self):
+        """Executed after reach test"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def seed(self, num_venues, cities=('San Francisco', 'New York', 'Austin')):
+        """Adds num_venues venues spread over cities, each with one past and
+        two upcoming shows by the same artist. Every other venue plays
+        Jazz."""
+        artist = Artist(name='Guns N Petals', genres=Genre.named(['Rock n Roll']))
+        db.session.add(artist)
+        jazz = Genre.named(['Jazz'])
+        for i in range(num_venues):
+            venue = Venue(name='Venue %d' % i, city=cities[i % len(cities)],
+                          state='CA', genres=jazz if i % 2 else [])
+            db.session.add(venue)
+            db.session.flush()
+            for days in (-3, 3, 7):
+                db.session.add(Show(venue_id=venue.id, artist_id=artist.id,
+                                    start_time=self.now + timedelta(days=days)))
+        db.session.commit()
+
+    def test_venue_areas(self):
+        self.seed(4)
+        areas = queries.venue_areas()
+        self.assertEqual([(a['state'], a['city']) for a in areas],
+                         [('CA', 'Austin'), ('CA', 'New York'), ('CA', 'San Francisco')])
+        self.assertEqual(areas[2]['venues'], [
+            {'id': 1, 'name': 'Venue 0', 'num_upcoming_shows': 2},
+            {'id': 4, 'name': 'Venue 3', 'num_upcoming_shows': 2},
+        ])
+
+    def test_venue_areas_without_shows(self):
+        db.session.add(Venue(name='Empty', city='Austin', state='TX', genres=[]))
+        db.session.commit()
+        areas = queries.venue_areas()
+        self.assertEqual(areas[0]['venues'][0]['num_upcoming_shows'], 0)
+
+    def test_venues_query_count_is_constant(self):
+        counts = []
+        for num_venues in (3, 30, 300):
+            self.seed(num_venues)
+            with count_queries() as statements:
+                res = self.client().get('/venues')
+            self.assertEqual(res.status_code, 200)
+            counts.append(len(statements))
+        self.assertEqual(counts, [1, 1, 1])
+
+    def test_venue_shows(self):
+        self.seed(2)
+        timeline = queries.venue_shows(1, self.now)
+        self.assertEqual(timeline['upcoming_shows_count'], 2)
+        self.assertEqual(timeline['past_shows_count'], 1)
+        self.assertEqual(timeline['past_shows'][0]['artist_name'], 'Guns N Petals')
+
+    def test_artist_shows(self):
+        self.seed(2)
+        timeline = queries.artist_shows(1, self.now)
+        self.assertEqual(timeline['upcoming_shows_count'], 4)
+        self.assertEqual(timeline['past_shows_count'], 2)
+        self.assertEqual({s['venue_name'] for s in timeline['past_shows']},
+                         {'Venue 0', 'Venue 1'})
+
+    def test_detail_pages_query_count(self):
+        self.seed(50)
+        for url in ('/venues/1', '/artists/1'):
+            with count_queries() as statements:
+                res = self.client().get(url)
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(len(statements), 3, url)
+
+    def test_search_counts_per_result(self):
+        self.seed(3)
+        venue = Venue(name='Venue without shows', city='Austin', state='TX', genres=[])
+        db.session.add(venue)
+        db.session.commit()
+        results = queries.search_venues('VENUE')
+        self.assertEqual(results['count'], 4)
+        self.assertEqual([v['num_upcoming_shows'] for v in results['data']], [2, 2, 2, 0])
+        results = queries.search_artists('petals')
+        self.assertEqual(results['data'], [{'id': 1, 'name': 'Guns N Petals', 'num_upcoming_shows': 6}])
+
+    def test_search_paging(self):
+        self.seed(30)
+        results = queries.search_venues('venue', limit=5, offset=5)
+        self.assertEqual(results['count'], 30)
+        self.assertEqual(len(results['data']), 5)
+        with count_queries() as statements:
+            res = self.client().post('/venues/search', data={'search_term': 'v'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(statements), 1)
+        for url in ('/venues/search', '/artists/search'):
+            for page in ({'limit': 0}, {'limit': -1}, {'offset': -5}):
+                res = self.client().post(url, data=dict(page, search_term='v'))
+                self.assertEqual(res.status_code, 400, (url, page))
+        res = self.client().post('/venues/search', data={'search_term': 'v', 'limit': 10 ** 6})
+        self.assertEqual(res.status_code, 200)
+
+    def test_ngram_index(self):
+        index = NgramIndex()
+        index.add(1, 'The Musical Hop')
+        index.add(2, 'Park Square Live Music & Coffee')
+        index.add(3, 'Hop Shop')
+        self.assertEqual(index.match('music'), {1, 2})
+        self.assertEqual(index.match('HOP'), {1, 3})
+        self.assertEqual(index.match('o'), {1, 2, 3})
+        self.assertEqual(index.match('sical hopx'), set())
+        self.assertEqual(index.rank('hop', {1, 3}), [3, 1])
+        index.remove(1)
+        self.assertEqual(index.match('music'), {2})
+
+    def test_search_escapes_like_wildcards(self):
+        self.seed(2)
+        db.session.add(Venue(name='100% Jazz_Bar', city='Austin', state='TX', genres=[]))
+        db.session.commit()
+
+        def like(term):
+            # the pattern PostgresSearchBackend filters with
+            return {v.name for v in Venue.query.filter(
+                Venue.name.ilike('%{}%'.format(escape_like(term)), escape='\\'))}
+        for term in ('%', '_', '0% j', 'z_b'):
+            self.assertEqual(like(term), {'100% Jazz_Bar'}, term)
+            self.assertEqual(queries.search_venues(term)['count'], 1, term)
+        self.assertEqual(like('venue'), {'Venue 0', 'Venue 1'})
+
+    def test_search_index_follows_writes(self):
+        self.seed(1)
+        self.assertEqual(queries.search_venues('jazz club')['count'], 0)
+        venue = Venue(name='Jazz Club', city='Austin', state='TX', genres=[])
+        db.session.add(venue)
+        db.session.commit()
+        self.assertEqual(queries.search_venues('jazz club')['count'], 1)
+        venue.name = 'Blues Club'
+        db.session.commit()
+        self.assertEqual(queries.search_venues('jazz club')['count'], 0)
+        self.assertEqual(queries.search_venues('blues')['count'], 1)
+        # a rollback only rebuilds the indexes its flushed writes touched
+        backend = get_backend()
+        queries.search_artists('petals')
+        db.session.add(Genre(name='Ska'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(set(backend.indexes), {Venue, Artist})
+        venue.name = 'Folk Club'
+        db.session.flush()
+        self.assertEqual(queries.search_venues('folk')['count'], 1)
+        db.session.rollback()
+        self.assertEqual(set(backend.indexes), {Artist})
+        self.assertEqual(queries.search_venues('folk')['count'], 0)
+        self.assertEqual(queries.search_venues('blues')['count'], 1)
+
+    def test_show_page_keyset(self):
+        self.seed(10)
+        seen, cursor = [], None
+        while True:
+            shows, cursor = queries.show_page(cursor, limit=7)
+            seen.extend(show['id'] for show in shows)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 30)
+        self.assertEqual(len(set(seen)), 30)
+
+    def test_shows_json_pages(self):
+        self.seed(20)
+        with count_queries() as statements:
+            res = self.client().get('/shows?format=json')
+        self.assertEqual(len(statements), 1)
+        data = res.get_json()
+        self.assertEqual(len(data['shows']), self.app.config['SHOWS_PAGE_SIZE'])
+        res = self.client().get('/shows?format=json&cursor=' + data['next_cursor'])
+        last = res.get_json()
+        self.assertEqual(len(last['shows']), 60 - self.app.config['SHOWS_PAGE_SIZE'])
+        self.assertIsNone(last['next_cursor'])
+        self.assertEqual(self.client().get('/shows?cursor=bogus').status_code, 400)
+
+    def test_genre_named(self):
+        self.seed(2)
+        genres = Genre.named(['Jazz', ' Blues ', 'Jazz', ''])
+        self.assertEqual([g.name for g in genres], ['Jazz', 'Blues'])
+        self.assertIsNotNone(genres[0].id)
+        self.assertIsNone(genres[1].id)
+
+    def test_browse_by_genre(self):
+        self.seed(6)
+        self.assertEqual([v['name'] for v in queries.venue_list(genre='Jazz')],
+                         ['Venue 1', 'Venue 3', 'Venue 5'])
+        self.assertEqual(queries.venue_list(genre='Blues'), [])
+        self.assertEqual(queries.artist_list(genre='Rock n Roll'),
+                         [{'id': 1, 'name': 'Guns N Petals'}])
+        areas = queries.venue_areas(genre='Jazz')
+        self.assertEqual(sum(len(a['venues']) for a in areas), 3)
+        res = self.client().get('/venues/2')
+        self.assertIn(b'/venues?genre=Jazz', res.data)
+
+    def counters(self, model, row_id):
+        db.session.expire_all()
+        row = model.query.get(row_id)
+        return row.upcoming_shows_count, row.past_shows_count
+
+    def test_show_counters_follow_writes(self):
+        self.seed(2)
+        self.assertEqual(self.counters(Venue, 1), (2, 1))
+        self.assertEqual(self.counters(Artist, 1), (4, 2))
+        show = Show.query.filter_by(venue_id=1).order_by(Show.start_time.desc()).first()
+        show.venue_id = 2
+        db.session.commit()
+        self.assertEqual(self.counters(Venue, 1), (1, 1))
+        self.assertEqual(self.counters(Venue, 2), (3, 1))
+        res = self.client().delete('/shows/%d' % show.id)
+        self.assertTrue(res.get_json()['success'])
+        self.assertEqual(self.counters(Venue, 2), (2, 1))
+        self.assertEqual(self.counters(Artist, 1), (3, 2))
+        venue = Venue(name='One Night Only', city='Austin', state='TX')
+        db.session.add(venue)
+        db.session.flush()
+        db.session.add(Show(venue_id=venue.id, artist_id=1, start_time=self.now))
+        db.session.commit()
+        self.assertEqual(self.counters(Artist, 1), (3, 3))
+        self.client().delete('/venues/%d' % venue.id)
+        self.assertEqual(self.counters(Artist, 1), (3, 2))
+
+    def test_roll_and_rebuild_show_counts(self):
+        self.seed(3)
+        later = self.now + timedelta(days=4)
+        self.assertEqual(show_counts.roll_past_shows(self.now, later), 3)
+        self.assertEqual(self.counters(Venue, 1), (1, 2))
+        self.assertEqual(self.counters(Artist, 1), (3, 6))
+        Venue.query.filter_by(id=2).update({'upcoming_shows_count': 9})
+        db.session.commit()
+        self.assertEqual(show_counts.rebuild_counts(later), 1)
+        self.assertEqual(self.counters(Venue, 2), (1, 2))
+
+    def test_show_starting_now_is_past(self):
+        self.seed(1)
+        at = self.now + timedelta(days=3)  # the start of venue 1's next show
+        show_counts.rebuild_counts(at)
+        timeline = queries.venue_shows(1, at)
+        self.assertEqual(self.counters(Venue, 1), (1, 2))
+        self.assertEqual((timeline['upcoming_shows_count'], timeline['past_shows_count']), (1, 2))
+
+    def test_memory_cache(self):
+        cache = MemoryCache(max_entries=2, default_ttl=60)
+        cache.set('a', 1, tags=('venues',))
+        cache.set('b', 2, tags=('venue:1',))
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)  # evicts b, the least recently used
+        self.assertIsNone(cache.get('b'))
+        cache.invalidate('venues')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), 3)
+        cache.set('d', 4, ttl=-1)
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 3)
+
+    def test_page_cache_invalidated_by_writes(self):
+        self.app.config['CACHE_BACKEND'] = 'memory'
+        self.seed(3)
+        self.assertEqual(self.client().get('/venues').headers['X-Cache'], 'MISS')
+        with count_queries() as statements:
+            res = self.client().get('/venues')
+        self.assertEqual(res.headers['X-Cache'], 'HIT')
+        self.assertEqual(statements, [])
+        self.client().post('/venues/create', data={
+            'name': 'The Dueling Pianos Bar', 'city': 'New York', 'state': 'NY',
+            'phone': '', 'address': '', 'genres': ['Classical'], 'webpage_link': '',
+            'image_link': '', 'facebook_link': '', 'description': ''})
+        self.client().get('/')  # consume the flashed message
+        res = self.client().get('/venues')
+        self.assertEqual(res.headers['X-Cache'], 'MISS')
+        self.assertIn(b'The Dueling Pianos Bar', res.data)
+        stats = self.client().get('/cache/stats').get_json()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True,
+                          'CACHE_STATS': False})
+        self.assertEqual(app.test_client().get('/cache/stats').status_code, 404)
+
+    def test_key_queries_use_indexes(self):
+        self.seed(30)
+        queries.search_venues('venue')  # builds the n-gram index
+        _, cursor = queries.show_page(limit=5)
+        for method, url, data in (
+                ('get', '/venues', None),
+                ('get', '/venues/3', None),
+                ('get', '/artists/1', None),
+                ('get', '/shows', None),
+                ('get', '/venues?genre=Jazz', None),
+                ('get', '/artists?genre=Jazz', None),
+                ('get', '/shows?cursor=' + cursor, None),
+                ('get', '/api/v1/shows/search?start=%s&end=%s' % (
+                    self.now.date(), (self.now + timedelta(days=5)).date()), None),
+                ('post', '/venues/search', {'search_term': 'venue 1'})):
+            with count_queries() as statements:
+                getattr(self.client(), method)(url, data=data)
+            self.assertEqual(full_scans(statements), [], url)
+
+    def test_detail_pages_404(self):
+        self.assertEqual(self.client().get('/venues/1000').status_code, 404)
+        self.assertEqual(self.client().get('/artists/1000').status_code, 404)
+
+    def test_format_datetime(self):
+        import babel.dates
+        when = datetime(2019, 5, 21, 21, 30)
+        for name, pattern in dates.PATTERNS.items():
+            expected = babel.dates.format_datetime(when, pattern)
+            self.assertEqual(dates.format_datetime(when, name), expected)
+            # strings are still accepted
+            self.assertEqual(dates.format_datetime(str(when), name), expected)
+        self.assertEqual(dates.format_datetime(when, 'y-MM-dd', 'de_DE'), '2019-05-21')
+        column = [when, when + timedelta(days=1), when]
+        self.assertEqual(dates.format_datetimes(column, 'full'),
+                         [dates.format_datetime(value, 'full') for value in column])
+
+    def test_shows_page_formats_start_times(self):
+        self.seed(1)
+        res = self.client().get('/shows')
+        self.assertIn(dates.format_datetime(self.now + timedelta(days=3), 'full').encode(), res.data)
+
+    def test_bulk_import_and_export(self):
+        header = 'id,name,city,state,address,phone,image_link,facebook_link,webpage_link,description,genres\n'
+        rows = ''.join('%d,Venue %d,Austin,TX,1 Main St,,,https://fb.com/%d,https://v.com,,"Jazz,Blues"\n'
+                       % (i, i, i) for i in range(1, 26))
+        res = self.client().post('/api/import/venues', data=header + rows + ',Bad,,XX,,,,,,,\n',
+                                 content_type='text/csv')
+        report = res.get_json()
+        self.assertEqual((report['rows'], report['inserted'], report['rejected']), (26, 25, 1))
+        self.assertEqual(report['errors'][0]['row'], 26)
+        self.assertIn('state', report['errors'][0]['errors'])
+        self.assertEqual(Venue.query.get(7).dictionary()['genres'], ['Blues', 'Jazz'])
+
+        artist = json.dumps({'name': 'Guns N Petals', 'city': 'Austin', 'state': 'TX',
+                             'webpage_link': 'https://g.com', 'facebook_link': 'https://fb.com/g',
+                             'genres': ['Rock n Roll']})
+        self.client().post('/api/import/artists', data=artist, content_type='application/x-ndjson')
+        shows = '\n'.join(json.dumps({'venue_id': venue_id, 'artist_id': 1, 'start_time': when})
+                          for venue_id, when in ((1, '2999-01-01 20:00:00'), (1, '2000-01-01 20:00:00'),
+                                                 (1000, '2999-01-01 20:00:00')))
+        report = self.client().post('/api/import/shows?format=jsonl', data=shows).get_json()
+        self.assertEqual((report['inserted'], report['rejected']), (2, 1))
+        venue = Venue.query.get(1)
+        self.assertEqual((venue.upcoming_shows_count, venue.past_shows_count), (1, 1))
+
+        # a failing chunk reports the rows committed before it
+        rows = [{'name': 'Venue %d' % i, 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+                 'facebook_link': 'https://fb.com/%d' % i, 'webpage_link': 'https://v.com',
+                 'genres': ['Jazz']} for i in (26, 27)]
+        with self.assertRaises(bulk.ImportFailed) as failed:
+            bulk.import_rows('venues', rows + [dict(rows[0], id=1)], chunk_size=2)
+        self.assertEqual((failed.exception.report.rows, failed.exception.report.inserted), (3, 2))
+        res = self.client().post('/api/import/venues?format=jsonl',
+                                 data=json.dumps(dict(rows[0], id=2)))
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(res.get_json()['inserted'], 0)
+        res = self.client().post('/api/import/venues?format=jsonl', data='{"name": ')
+        self.assertEqual(res.status_code, 400)
+        self.assertFalse(res.get_json()['success'])
+        self.assertEqual(self.client().post('/api/import/venues?format=jsonl',
+                                            data='[1, 2]').status_code, 400)
+        db.session.query(Venue).filter(Venue.id > 25).delete()
+        db.session.commit()
+
+        exported = self.client().get('/api/export/venues').data.decode().splitlines()
+        self.assertEqual(exported[0], header.strip())
+        self.assertEqual(len(exported), 26)
+        self.assertEqual(exported[1], '1,Venue 1,Austin,TX,1 Main St,,,https://fb.com/1,https://v.com,,"Blues,Jazz"')
+        exported = self.client().get('/api/export/shows?format=jsonl').data.decode().splitlines()
+        self.assertEqual(json.loads(exported[0]), {'id': 1, 'venue_id': 1, 'artist_id': 1,
+                                                   'start_time': '2999-01-01 20:00:00',
+                                                   'duration': 120})
+
+    def test_api_streams_listings(self):
+        self.seed(5)
+        venues = self.client().get('/api/v1/venues').get_json()
+        self.assertEqual([venue['id'] for venue in venues], [1, 2, 3, 4, 5])
+        self.assertEqual(venues[1]['genres'], ['Jazz'])
+        self.assertEqual(venues[1]['upcoming_shows_count'], 2)
+        jazz = self.client().get('/api/v1/venues?genre=Jazz').get_json()
+        self.assertEqual([venue['id'] for venue in jazz], [2, 4])
+        lines = self.client().get('/api/v1/shows?format=jsonl').data.decode().splitlines()
+        self.assertEqual(len(lines), 15)
+        self.assertEqual(json.loads(lines[0])['artist_name'], 'Guns N Petals')
+        self.assertEqual(self.client().get('/api/v1/artists').get_json()[0]['genres'], ['Rock n Roll'])
+        # one streamed query, plus a genre lookup per chunk of rows
+        with count_queries() as statements:
+            rows = list(queries.stream_venues(chunk_size=2))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(len(statements), 1 + 3)
+
+    def test_api_etags(self):
+        self.seed(2)
+        res = self.client().get('/api/v1/venues')
+        tag = res.headers['ETag']
+        with count_queries() as statements:
+            res = self.client().get('/api/v1/venues', headers={'If-None-Match': tag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(len(statements), 1)
+        self.assertNotEqual(self.client().get('/api/v1/venues?genre=Jazz').headers['ETag'], tag)
+        venue = Venue.query.get(1)
+        venue.name = 'Renamed'
+        db.session.commit()
+        res = self.client().get('/api/v1/venues', headers={'If-None-Match': tag})
+        self.assertEqual(res.status_code, 200)
+        shows_tag = self.client().get('/api/v1/shows').headers['ETag']
+        db.session.add(Show(venue_id=1, artist_id=1, start_time=self.now))
+        db.session.commit()
+        self.assertNotEqual(self.client().get('/api/v1/shows').headers['ETag'], shows_tag)
+
+    def test_versions_bumped_after_commit(self):
+        self.seed(1)
+        before = versions.current('venues', 'shows')
+        db.session.add(Venue(name='Late Venue', city='Austin', state='TX', genres=[]))
+        db.session.flush()
+        # the writer's transaction does not touch DataVersion
+        self.assertEqual(db.session.execute(
+            'select version from "DataVersion" where name = \'venues\'').scalar(),
+            before['venues'] or None)
+        db.session.commit()
+        after = versions.current('venues', 'shows')
+        self.assertEqual(after, {name: version + 1 for name, version in before.items()})
+        db.session.add(Venue(name='Dropped Venue', city='Austin', state='TX', genres=[]))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(versions.current('venues', 'shows'), after)
+
+    def test_read_models_match_orm(self):
+        self.seed(4)
+        rows = read_models.venue_rows()
+        self.assertEqual([row.dictionary() for row in rows],
+                         [venue.dictionary() for venue in Venue.query.order_by(Venue.id)])
+        self.assertEqual(read_models.artist(1).dictionary(), Artist.query.get(1).dictionary())
+        self.assertEqual([row.dictionary() for row in read_models.show_rows()],
+                         [show.dictionary() for show in Show.query.order_by(Show.id)])
+        self.assertIsNone(read_models.venue(1000))
+        self.assertEqual(read_models.venue_rows([]), [])
+
+    def test_query_profiler(self):
+        self.seed(3)
+        res = self.client().get('/venues/1')
+        self.assertRegex(res.headers['Server-Timing'], r'^db;dur=[0-9.]+;desc="3 queries"$')
+        self.assertNotIn('X-Query-Repeats', res.headers)
+        self.app.config['QUERY_BUDGETS'] = {'venues.show_venue': 2}
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client().get('/venues/1')
+
+    def test_query_profiler_flags_repeated_statements(self):
+        self.seed(6)
+
+        @self.app.route('/n-plus-one')
+        def n_plus_one():
+            return jsonify([Venue.query.get(venue_id).name for venue_id in range(1, 7)])
+
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            res = self.client().get('/n-plus-one')
+        # the venue, and the selectin load of its genres
+        self.assertEqual(res.headers['X-Query-Repeats'], '2')
+        self.assertIn('possible N+1 in n_plus_one: 6 x SELECT', logs.output[0])
+
+    def test_show_window_search(self):
+        self.seed(6)
+        rock = Artist(name='Quevado', genres=Genre.named(['Jazz']))
+        db.session.add(rock)
+        db.session.flush()
+        db.session.add(Show(venue_id=1, artist_id=rock.id, start_time=self.now + timedelta(days=4)))
+        db.session.commit()
+
+        def search(**args):
+            args.setdefault('start', (self.now + timedelta(days=1)).isoformat())
+            args.setdefault('end', (self.now + timedelta(days=5)).isoformat())
+            return self.client().get('/api/v1/shows/search', query_string=args)
+
+        data = search().get_json()
+        self.assertEqual(len(data['shows']), 7)
+        self.assertEqual(data['shows'][-1]['artist_name'], 'Quevado')
+        self.assertEqual(len(search(city='Austin').get_json()['shows']), 2)
+        self.assertEqual(len(search(state='NY').get_json()['shows']), 0)
+        self.assertEqual([show['artist_name'] for show in search(genre='Jazz').get_json()['shows']],
+                         ['Quevado'])
+        first = search(limit=4).get_json()
+        rest = search(limit=4, cursor=first['next_cursor']).get_json()
+        self.assertEqual(len(first['shows']) + len(rest['shows']), 7)
+        self.assertIsNone(rest['next_cursor'])
+        self.assertEqual(search(start='yesterday').status_code, 400)
+        for limit in (0, -1):
+            self.assertEqual(search(limit=limit).status_code, 400)
+        self.assertEqual(len(search(limit=1).get_json()['shows']), 1)
+        res = search()
+        self.assertEqual(self.client().get('/api/v1/shows/search', query_string={
+            'start': (self.now + timedelta(days=1)).isoformat(),
+            'end': (self.now + timedelta(days=5)).isoformat()
+        }, headers={'If-None-Match': res.headers['ETag']}).status_code, 304)
+
+    def test_interval_index(self):
+        index = schedule.IntervalIndex(max_length=10)
+        index.add('a', 0, 10, 'x')
+        index.add('a', 20, 25, 'y')
+        index.add('b', 5, 8, 'z')
+        self.assertEqual(index.overlapping('a', 9, 12), 'x')
+        self.assertIsNone(index.overlapping('a', 10, 20))
+        self.assertEqual(index.overlapping('a', 12, 21), 'y')
+        self.assertIsNone(index.overlapping('a', 0, 10, ignore='x'))
+        index.remove('x')
+        self.assertIsNone(index.overlapping('a', 0, 10))
+        self.assertIsNone(index.overlapping('c', 0, 10))
+
+    def test_double_booking(self):
+        self.now = self.now.replace(microsecond=0)  # as bulk imports take it
+        self.seed(1)
+        db.session.add(Artist(name='The Wild Sax Band'))
+        db.session.commit()
+        show_time = self.now + timedelta(days=3)
+
+        def create(venue_id, artist_id, start_time, duration=''):
+            self.client().post('/shows/create', data={
+                'venue_id': venue_id, 'artist_id': artist_id, 'duration': duration,
+                'start_time': str(start_time)})
+            return Show.query.count()
+
+        # venue 1 is taken for two hours from show_time
+        self.assertEqual(create(1, 2, show_time + timedelta(hours=1)), 3)
+        self.assertEqual(create(1, 2, show_time - timedelta(minutes=30), 31), 3)
+        self.assertEqual(create(1, 2, show_time + timedelta(hours=2), 60), 4)
+        # and so is artist 2, now
+        self.assertEqual(create(1, 2, show_time + timedelta(hours=2, minutes=59)), 4)
+        self.assertEqual(create(1, 2, show_time - timedelta(minutes=30), 30), 5)
+        self.assertEqual(Show.query.get(5).duration, 30)
+
+        shows = '\n'.join(json.dumps({'venue_id': 1, 'artist_id': 2, 'duration': 60,
+                                      'start_time': str(show_time + timedelta(hours=hours))})
+                          for hours in (3, 3.5, 4))
+        report = self.client().post('/api/import/shows?format=jsonl', data=shows).get_json()
+        self.assertEqual((report['inserted'], report['rejected']), (2, 1))
+        self.assertEqual(report['errors'][0]['row'], 2)
+        # the index is rebuilt with the imported shows
+        self.assertEqual(create(1, 2, show_time + timedelta(hours=4, minutes=30)), 7)
+
+    def test_booking_reserves_slot(self):
+        self.seed(1)
+        backend = schedule.get_schedule()
+        start = self.now + timedelta(days=30)
+        first = Show(venue_id=1, artist_id=1, start_time=start, duration=60)
+        second = Show(venue_id=1, artist_id=1, start_time=start + timedelta(minutes=30))
+        with backend.reserve(first):
+            # as another thread would check it before first is flushed
+            with self.assertRaises(schedule.ScheduleConflict):
+                backend.check(second)
+        backend.check(second)
+        # shows without a start_time hold no slot
+        db.session.execute(Show.__table__.insert().values(
+            venue_id=1, artist_id=1, start_time=None, duration=60))
+        db.session.commit()
+        backend.invalidate()
+        backend.check(Show(venue_id=1, artist_id=1, duration=60))
+        backend.check(second)
+        self.assertEqual(list(schedule.find_conflicts()), [])
+
+    def test_find_conflicts(self):
+        self.seed(2)
+        # the seeded artist plays both venues at the same times
+        conflicts = list(schedule.find_conflicts())
+        self.assertEqual(conflicts, [('artist_id', 1, 4, 1), ('artist_id', 1, 5, 2),
+                                     ('artist_id', 1, 6, 3)])
+
+    def test_engine_options(self):
+        environ = {'DB_POOL_SIZE': '2', 'DB_MAX_OVERFLOW': '3', 'DB_POOL_PRE_PING': 'off',
+                   'DB_STATEMENT_TIMEOUT': '5000'}
+        options = db_settings.engine_options('postgresql://localhost/fyyur', environ=environ)
+        self.assertEqual((options['pool_size'], options['max_overflow'], options['pool_recycle']),
+                         (2, 3, 1800))
+        self.assertFalse(options['pool_pre_ping'])
+        self.assertEqual(options['connect_args'], {'options': '-c statement_timeout=5000'})
+        options = db_settings.engine_options('sqlite://', environ=environ)
+        self.assertNotIn('pool_size', options)
+        self.assertNotIn('connect_args', options)
+
+    def test_pool_metrics(self):
+        metrics = db_settings.PoolMetrics()
+        environ = {'DB_POOL_SIZE': '1', 'DB_MAX_OVERFLOW': '1', 'DB_POOL_TIMEOUT': '0'}
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        uri = 'sqlite:///%s/pool.db' % directory.name
+        engine = create_engine(uri, **db_settings.engine_options(uri, metrics, environ))
+        self.addCleanup(engine.dispose)
+        connections = [engine.connect(), engine.connect()]
+        self.assertEqual((metrics.checkouts, metrics.in_use(), metrics.saturation()), (2, 2, 1.0))
+        with self.assertRaises(TimeoutError):
+            engine.connect()
+        self.assertEqual(metrics.errors, 1)
+        for connection in connections:
+            connection.close()
+        self.assertEqual(metrics.saturation(), 0.0)
+        self.assertIn('db_pool_checkout_seconds_count 2\n', metrics.render())
+
+        self.client().get('/venues')
+        res = self.client().get('/metrics')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'db_pool_connection_errors_total 0\n', res.data)
+        self.assertNotIn(b'db_pool_checkout_seconds_count 0\n', res.data)
+
+    def test_configure_twice(self):
+        # as trivia's setup_db, called again by its tests with their database
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_recycle': 60}
+        environ = {'DB_POOL_SIZE': '2', 'DB_MAX_OVERFLOW': '-1'}
+        metrics = db_settings.configure(app, 'sqlite://', environ)
+        self.assertIs(db_settings.configure(app, 'postgresql://localhost/test', environ), metrics)
+        self.assertEqual([rule.rule for rule in app.url_map.iter_rules('metrics')], ['/metrics'])
+        options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        self.assertEqual((options['pool_size'], options['pool_recycle']), (2, 60))
+        self.assertTrue(issubclass(options['poolclass'], QueuePool))
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        engine = create_engine('sqlite:///%s/pool.db' % directory.name,
+                               poolclass=options['poolclass'], pool_size=1, max_overflow=-1)
+        self.addCleanup(engine.dispose)
+        connections = [engine.connect() for _ in range(3)]
+        self.assertEqual((metrics.in_use(), metrics.capacity()), (3, 3))
+        for connection in connections:
+            connection.close()
+
+    def test_read_replica_routing(self):
+        # two in-memory databases stand in for a primary and its replica
+        config = {'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True,
+                  'SQLALCHEMY_REPLICA_URIS': ['sqlite://'], 'CACHE_BACKEND': None}
+        # the stickiness cookie must verify in every process
+        with self.assertRaises(RuntimeError):
+            create_app(config)
+        app = create_app(dict(config, SECRET_KEY='shared by every worker'))
+        with app.app_context():
+            db.create_all()
+            replica = db.get_engine(app, bind='replica:0')
+            db.Model.metadata.create_all(replica)
+            db.session.add(Venue(name='On the primary', city='Austin', state='TX'))
+            db.session.commit()
+            replica.execute(Venue.__table__.insert(), name='On the replica', city='Austin', state='TX')
+
+            client, other = app.test_client(), app.test_client()
+            self.assertIn(b'On the replica', client.get('/venues/1').data)
+            self.assertIn(b'On the replica', client.get('/venues').data)
+            client.post('/venues/1/edit', data={
+                'name': 'Renamed', 'city': 'Austin', 'state': 'TX', 'phone': '', 'address': '',
+                'webpage_link': '', 'image_link': '', 'facebook_link': '', 'description': ''})
+            self.assertEqual(Venue.query.get(1).name, 'Renamed')
+            with client.session_transaction() as cookie:
+                self.assertIn('db_primary_until', cookie)
+            # the writer reads its own write, other clients the replica
+            self.assertIn(b'Renamed', client.get('/venues/1').data)
+            self.assertIn(b'On the replica', other.get('/venues/1').data)
+            app.config['REPLICA_STICKY_SECONDS'] = 0
+            client.post('/venues/1/edit', data={
+                'name': 'Renamed again', 'city': 'Austin', 'state': 'TX', 'phone': '',
+                'address': '', 'webpage_link': '', 'image_link': '', 'facebook_link': '',
+                'description': ''})
+            self.assertIn(b'On the replica', client.get('/venues/1').data)
+            # writes that skip the flush mark the request too
+            with app.test_request_context('/venues/1/delete', method='POST'):
+                replicas.start_request()
+                db.session.connection().execute(Venue.__table__.select()).fetchall()
+                self.assertFalse(g.db_wrote)
+                db.session.connection().execute(
+                    Venue.__table__.update().values(name='Core write'))
+                self.assertTrue(g.db_wrote)
+            db.session.remove()
+
+    def test_page_cache_with_replicas(self):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True,
+                          'SQLALCHEMY_REPLICA_URIS': ['sqlite://'], 'CACHE_BACKEND': 'memory',
+                          'SECRET_KEY': 'shared by every worker'})
+        edit = {'name': 'Renamed', 'city': 'Austin', 'state': 'TX', 'phone': '', 'address': '',
+                'webpage_link': '', 'image_link': '', 'facebook_link': '', 'description': ''}
+        with app.app_context():
+            db.create_all()
+            replica = db.get_engine(app, bind='replica:0')
+            db.Model.metadata.create_all(replica)
+            db.session.add(Venue(name='On the primary', city='Austin', state='TX'))
+            db.session.commit()
+            replica.execute(Venue.__table__.insert(), name='On the replica', city='Austin', state='TX')
+
+            client, other = app.test_client(), app.test_client()
+            self.assertEqual(other.get('/venues/1').headers['X-Cache'], 'MISS')
+            self.assertEqual(other.get('/venues/1').headers['X-Cache'], 'HIT')
+            client.post('/venues/1/edit', data=edit)
+            client.get('/')  # consume the flashed message
+            # the writer skips the cache while pinned to the primary
+            res = client.get('/venues/1')
+            self.assertNotIn('X-Cache', res.headers)
+            self.assertIn(b'Renamed', res.data)
+            # the lagging replica's page is not cached until the hold ends
+            for _ in range(2):
+                res = other.get('/venues/1')
+                self.assertEqual(res.headers['X-Cache'], 'MISS')
+            app.extensions['cache'].holds.clear()  # REPLICA_STICKY_SECONDS later
+            self.assertEqual(other.get('/venues/1').headers['X-Cache'], 'MISS')
+            self.assertEqual(other.get('/venues/1').headers['X-Cache'], 'HIT')
+            db.session.remove()
+
+    def test_detail_pages_gather_queries(self):
+        self.seed(2)
+        sync = [self.client().get(url).data for url in ('/venues/2', '/artists/1')]
+        db.session.remove()  # the scoped session belongs to this app
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s/fyyur.db' % directory.name,
+                          'TESTING': True, 'CACHE_BACKEND': None, 'QUERY_BUDGET_RAISE': True,
+                          'PAGE_QUERY_WORKERS': 3})
+        self.addCleanup(app.extensions['page_executor'].shutdown)
+        with app.app_context():
+            db.create_all()
+            self.seed(2)
+            threads = set()
+            event.listen(db.engine, 'before_cursor_execute',
+                         lambda *args: threads.add(threading.current_thread().name))
+            # the same pages, every query on a worker thread
+            gathered = [app.test_client().get(url).data for url in ('/venues/2', '/artists/1')]
+            self.assertTrue(all(name.startswith('page-queries') for name in threads))
+            self.assertGreater(len(threads), 1)
+            db.session.remove()
+            db.get_engine(app).dispose()
+        self.assertEqual(gathered, sync)
+
+    def test_create_app_defers_forms_and_migrations(self):
+        loaded = subprocess.check_output([sys.executable, '-c',
+            'import sys; from app import create_app; create_app(); '
+            'print(sorted({"flask_wtf", "wtforms", "flask_migrate", "alembic", '
+            '"flask_script"} & set(sys.modules)))'])
+        self.assertEqual(loaded.strip(), b'[]')
+        for url in ('/venues/create', '/artists/create', '/shows/create'):
+            self.assertEqual(self.client().get(url).status_code, 200, url)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+#----------------------------------------------------------------------------#
+# Listing versions.
+#
+# DataVersion holds a counter per listing ('venues', 'artists', 'shows')
+# that goes up after every commit of a write changing what the listing
+# returns. The JSON API derives its ETags from them, so answering
+# If-None-Match costs one primary-key lookup instead of reading the table.
+#
+# The bump runs in a short transaction of its own once the write has
+# committed, not in the writer's transaction: concurrent writers (and bulk
+# imports, chunk after chunk) would otherwise queue on the listing's row
+# lock until each other's commit. The API reads the version before the
+# rows, so a response is never tagged with a version newer than its data.
+#
+# ORM writes are picked up on flush. Writes that bypass the ORM (bulk
+# inserts, show_counts.refresh) call changed() themselves.
+#----------------------------------------------------------------------------#
+
+import logging
+
+from sqlalchemy import event, select
+
+from models import db, DataVersion, Show, Venue, Artist
+
+logger = logging.getLogger(__name__)
+
+LISTINGS = ('venues', 'artists', 'shows')
+
+# the listings each model's rows appear in; shows carry venue and artist
+# names, venues and artists carry show counts
+AFFECTS = {
+    Venue: ('venues', 'shows'),
+    Artist: ('artists', 'shows'),
+    Show: ('shows', 'venues', 'artists'),
+}
+
+
+def current(*names):
+    '''
+    {name: version} for the given listings; never-bumped ones are 0.
+    '''
+    table = DataVersion.__table__
+    versions = dict.fromkeys(names, 0)
+    versions.update(db.session.execute(
+        select([table.c.name, table.c.version]).where(table.c.name.in_(names))).fetchall())
+    return versions
+
+
+def changed(session, names):
+    '''
+    Records that the session's transaction changes the given listings;
+    their versions go up once it commits.
+    '''
+    session.info.setdefault('data_versions', set()).update(names)
+
+
+def bump(connection, names):
+    table = DataVersion.__table__
+    # a fixed order keeps concurrent writers from deadlocking on these rows
+    names = sorted(set(names))
+    updated = connection.execute(table.update().where(table.c.name.in_(names)).values(
+        version=table.c.version + 1)).rowcount
+    if updated < len(names):
+        existing = {row[0] for row in connection.execute(
+            select([table.c.name]).where(table.c.name.in_(names)))}
+        connection.execute(table.insert(), [
+            {'name': name, 'version': 1} for name in names if name not in existing])
+
+
+#  Flush hooks
+#  ----------------------------------------------------------------
+
+@event.listens_for(db.session, 'before_flush')
+def collect_changes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        changed(session, AFFECTS.get(type(obj), ()))
+
+
+@event.listens_for(db.session, 'after_commit')
+def apply_changes(session):
+    if session.transaction is not None and session.transaction.nested:
+        return  # a savepoint; the outer transaction may still roll back
+    names = session.info.pop('data_versions', None)
+    if not names:
+        return
+    try:
+        with db.engine.begin() as connection:
+            bump(connection, names)
+    except Exception:
+        # the write stands; its listings keep their ETags until the next one
+        logger.exception('bumping data versions %s failed', sorted(names))
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def discard_changes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('data_versions', None)
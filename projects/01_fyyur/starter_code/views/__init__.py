@@ -0,0 +1,3 @@
+# Blueprints registered by create_app() in app.py. Each imports its form
+# classes inside the views that render or validate them, so serving read
+# pages never loads Flask-WTF/WTForms.
@@ -0,0 +1,134 @@
+#----------------------------------------------------------------------------#
+# Versioned JSON API.
+#
+# Listings stream as a JSON array (default) or, with ?format=jsonl, as JSON
+# Lines, a chunk of rows per write. Responses carry a weak ETag built from
+# the listing's DataVersion and the query string; a matching If-None-Match
+# gets a 304 without touching the listed table.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, request, jsonify, abort, current_app, stream_with_context
+
+import queries
+from profiler import query_budget
+import versions
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+MIMETYPES = {'json': 'application/json', 'jsonl': 'application/x-ndjson'}
+
+# the most shows one page of /shows/search returns
+MAX_PAGE_SIZE = 500
+
+
+def etag(listing):
+    version = versions.current(listing)[listing]
+    key = '%s:%d:%s' % (listing, version, sorted(request.args.items(multi=True)))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def encode(rows, format, chunk_size=queries.STREAM_CHUNK_SIZE):
+    # one string per chunk_size rows
+    if format == 'jsonl':
+        buffer = []
+        for row in rows:
+            buffer.append(json.dumps(row))
+            if len(buffer) == chunk_size:
+                yield '\n'.join(buffer) + '\n'
+                buffer = []
+        if buffer:
+            yield '\n'.join(buffer) + '\n'
+        return
+    yield '['
+    separator = ''
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(row))
+        if len(buffer) == chunk_size:
+            yield separator + ','.join(buffer)
+            separator, buffer = ',', []
+    if buffer:
+        yield separator + ','.join(buffer)
+    yield ']'
+
+
+def listing(name, rows):
+    '''
+    The streamed response for a listing. rows is a function returning the row
+    iterator; it is only called when the body is actually sent.
+    '''
+    format = request.args.get('format', 'json')
+    if format not in MIMETYPES:
+        abort(400)
+    tag = etag(name)
+    if request.if_none_match.contains_weak(tag):
+        response = Response(status=304)
+    else:
+        response = Response(stream_with_context(encode(rows(), format)),
+                            mimetype=MIMETYPES[format])
+    response.set_etag(tag, weak=True)
+    return response
+
+
+@bp.route('/venues')
+@query_budget(1)  # the version lookup; rows are read while streaming
+def venues():
+    return listing('venues', lambda: queries.stream_venues(genre=request.args.get('genre')))
+
+
+@bp.route('/artists')
+@query_budget(1)
+def artists():
+    return listing('artists', lambda: queries.stream_artists(genre=request.args.get('genre')))
+
+
+@bp.route('/shows')
+@query_budget(1)
+def shows():
+    return listing('shows', queries.stream_shows)
+
+
+def time_arg(name):
+    # ISO 8601 date or date and time, e.g. 2024-05-01 or 2024-05-01T18:00
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400)
+
+
+@bp.route('/shows/search')
+@query_budget(2)
+def search_shows():
+    '''
+    Shows starting in [start, end), optionally at venues in city/state or by
+    artists of genre, a keyset page at a time (pass back next_cursor).
+    '''
+    start, end = time_arg('start'), time_arg('end')
+    limit = min(request.args.get('limit', current_app.config['SHOWS_PAGE_SIZE'], type=int),
+                MAX_PAGE_SIZE)
+    if limit < 1:
+        abort(400)
+    tag = etag('shows')
+    if request.if_none_match.contains_weak(tag):
+        response = Response(status=304)
+    else:
+        try:
+            shows, next_cursor = queries.show_page(
+                request.args.get('cursor'), limit, start=start, end=end,
+                city=request.args.get('city'), state=request.args.get('state'),
+                genre=request.args.get('genre'))
+        except ValueError:
+            abort(400)
+        response = jsonify({
+            'shows': [dict(show, start_time=show['start_time'].isoformat()) for show in shows],
+            'next_cursor': next_cursor
+        })
+    response.set_etag(tag, weak=True)
+    return response
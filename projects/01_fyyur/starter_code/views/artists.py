@@ -0,0 +1,169 @@
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+import sys
+
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, abort
+
+from models import db, Genre, Artist
+import queries
+import read_models
+from parallel import gather
+from profiler import query_budget
+from cache import cached_page, invalidate
+from views.venues import search_page
+
+bp = Blueprint('artists', __name__)
+
+
+@bp.route('/artists')
+@query_budget(1)
+@cached_page(lambda: ('artists',))
+def artists():
+    # TODO: replace with real data returned from querying the database
+    return render_template('pages/artists.html',
+                           artists=queries.artist_list(genre=request.args.get('genre')))
+
+
+@bp.route('/artists/search', methods=['POST'])
+@query_budget(2)
+def search_artists():
+    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+    # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+    # search for "band" should return "The Wild Sax Band".
+    term =request.form.get('search_term', '').lower()
+    response = queries.search_artists(term, **search_page())
+    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+
+
+@bp.route('/artists/<int:artist_id>')
+@query_budget(3)
+@cached_page(lambda artist_id: ('artist:%d' % artist_id, 'artist-pages'))
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    artist, genres, shows = gather(
+        lambda: read_models.artist(artist_id, genres=False),
+        lambda: read_models.artist_genres_of(artist_id),
+        lambda: queries.artist_shows(artist_id))
+    if artist is None:
+        abort(404)
+    artist_dto = artist._replace(genres=genres).dictionary()
+    artist_dto.update(shows)
+    return render_template('pages/show_artist.html', artist=artist_dto)
+
+#  Update
+#  ----------------------------------------------------------------
+
+
+@bp.route('/artists/<artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+    # TODO: Complete this endpoint for taking a venue_id, and using
+    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    error = False
+    try:
+        artist = Artist.query.get(artist_id)
+        db.session.delete(artist)
+        db.session.commit()
+        invalidate('artists', 'artist:%s' % artist_id, 'shows', 'venues', 'venue-pages')
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+        if error:
+            flash('An error occurred. Artist could not be deleted.')
+        else:
+            flash('Artist ' + artist.name +' was successfully deleted!')
+    return jsonify({ 'success': True })
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+    from forms import ArtistForm
+    form = ArtistForm()
+    artist = Artist.query.get(artist_id)
+    # TODO: populate form with fields from artist with ID <artist_id>
+    return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+    # TODO: take values from the form submitted, and update existing
+    # artist record with ID <artist_id> using the new attributes
+    error = False
+    try:
+        artist = Artist.query.get(artist_id)
+        artist.name = request.form['name']
+        artist.city = request.form['city']
+        artist.state = request.form['state']
+        artist.phone = request.form['phone']
+        artist.genres = Genre.named(request.form.getlist('genres'))
+        artist.webpage_link = request.form['webpage_link']
+        artist.image_link = request.form['image_link']
+        artist.facebook_link = request.form['facebook_link']
+        artist.description = request.form['description']
+        artist.seeking_venue = True
+        if not artist.description:
+            artist.seeking_venue = False
+        db.session.commit()
+        invalidate('artists', 'artist:%s' % artist_id, 'shows', 'venue-pages')
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+        if error:
+            flash('An error occurred. Artist ' +
+                  request.form['name'] + ' could not be listed.')
+        else:
+            flash('Artist ' + request.form['name'] +
+                  ' was successfully listed!')
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+    from forms import ArtistForm
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+    error = False
+    try:
+        artist = Artist()
+        artist.name = request.form['name']
+        artist.city = request.form['city']
+        artist.state = request.form['state']
+        artist.phone = request.form['phone']
+        artist.genres = Genre.named(request.form.getlist('genres'))
+        artist.webpage_link = request.form['webpage_link']
+        artist.image_link = request.form['image_link']
+        artist.facebook_link = request.form['facebook_link']
+        artist.description = request.form['description']
+        artist.seeking_venue = True
+        if not artist.description:
+            artist.seeking_venue = False
+        db.session.add(artist)
+        db.session.commit()
+        invalidate('artists')
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+        if error:
+            flash('An error occurred. Artist ' +
+                  request.form['name'] + ' could not be listed.')
+        else:
+            flash('Artist ' + request.form['name'] +
+                  ' was successfully listed!')
+        return render_template('pages/home.html')
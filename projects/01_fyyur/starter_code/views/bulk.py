@@ -0,0 +1,71 @@
+#----------------------------------------------------------------------------#
+# Bulk import/export API.
+#----------------------------------------------------------------------------#
+
+import io
+import sys
+
+from flask import Blueprint, Response, request, jsonify, abort, current_app, stream_with_context
+
+import bulk
+
+bp = Blueprint('bulk', __name__, url_prefix='/api')
+
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def requested_format(default='csv'):
+    # ?format= wins over the body's content type
+    format = request.args.get('format')
+    if format is None:
+        format = {mimetype: name for name, mimetype in MIMETYPES.items()}.get(
+            request.mimetype, default)
+    if format not in bulk.FORMATS:
+        abort(400)
+    return format
+
+
+def failure_response(failure):
+    # the rows committed before the failing chunk, and what went wrong: the
+    # file's fault (4xx, with the reason) or ours (500)
+    error = failure.error
+    if isinstance(error, bulk.CONFLICT):
+        status, message = 409, str(getattr(error, 'orig', error))
+    elif isinstance(error, bulk.BAD_INPUT):
+        status, message = 400, str(error)
+    else:
+        print(sys.exc_info())
+        status, message = 500, 'internal error'
+    return jsonify(dict(failure.report.dictionary(), success=False, error=message)), status
+
+
+@bp.route('/import/<kind>', methods=['POST'])
+def import_data(kind):
+    # streams the request body through the import pipeline chunk by chunk
+    if kind not in bulk.KINDS:
+        abort(404)
+    format = requested_format()
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    try:
+        report = bulk.import_rows(kind, bulk.read_rows(stream, format))
+    except bulk.ImportFailed as failure:
+        return failure_response(failure)
+    return jsonify(dict(report.dictionary(), success=True))
+
+
+@bp.route('/export/<kind>')
+def export_data(kind):
+    if kind not in bulk.KINDS:
+        abort(404)
+    format = request.args.get('format', 'csv')
+    if format not in bulk.FORMATS:
+        abort(400)
+    report = bulk.Report()
+
+    def generate():
+        yield from bulk.export(kind, format, report=report)
+        current_app.logger.info('exported %d %s in %.1fs (%.0f rows/sec)',
+                                report.rows, kind, report.elapsed, report.rows_per_sec)
+
+    return Response(stream_with_context(generate()), mimetype=MIMETYPES[format], headers={
+        'Content-Disposition': 'attachment; filename=%s.%s' % (kind, format)})
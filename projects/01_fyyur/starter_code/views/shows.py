@@ -0,0 +1,107 @@
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+import sys
+
+from flask import Blueprint, render_template, request, flash, jsonify, abort, current_app
+
+from models import db, Show
+from models.Show import DEFAULT_DURATION
+import queries
+import schedule
+from dates import format_datetimes, parse
+from profiler import query_budget
+from cache import cached_page, invalidate, remember
+
+bp = Blueprint('shows', __name__)
+
+
+@bp.route('/shows')
+@query_budget(1)
+@cached_page(lambda: ('shows',))
+def shows():
+    # displays list of shows at /shows
+    try:
+        cursor = request.args.get('cursor')
+        # the HTML page and ?format=json share one cached page of rows
+        shows_dtos, next_cursor = remember(
+            'shows:%s' % cursor, ('shows',),
+            lambda: queries.show_page(cursor, current_app.config['SHOWS_PAGE_SIZE']))
+    except ValueError:
+        abort(400)
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'shows': [dict(show, start_time=show['start_time'].strftime("%m/%d/%Y, %H:%M:%S"))
+                      for show in shows_dtos],
+            'next_cursor': next_cursor
+        })
+    # one batch call instead of the datetime filter on every tile
+    start_times = format_datetimes([show['start_time'] for show in shows_dtos], 'full')
+    return render_template('pages/shows.html', shows=shows_dtos, start_times=start_times,
+                           next_cursor=next_cursor)
+
+
+@bp.route('/shows/create')
+def create_shows():
+    # renders form. do not touch.
+    from forms import ShowForm
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+    # called to create new shows in the db, upon submitting new show listing form
+    error = False
+    conflict = None
+    try:
+        show = Show()
+        show.artist_id = int(request.form['artist_id'])
+        show.venue_id = int(request.form['venue_id'])
+        show.start_time = parse(request.form['start_time'])
+        show.duration = int(request.form.get('duration') or DEFAULT_DURATION)
+        schedule.book(show)
+        db.session.commit()
+        invalidate('shows', 'venues', 'venue:%s' % request.form['venue_id'],
+                   'artist:%s' % request.form['artist_id'])
+    except schedule.ScheduleConflict as e:
+        conflict = e
+        db.session.rollback()
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+        if conflict is not None:
+            flash('Show could not be listed. %s.' % conflict)
+        elif error:
+            flash('An error occurred. Show could not be listed.')
+        else:
+            # on successful db insert, flash success
+            # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+            flash('Show was successfully listed!')
+    return render_template('pages/home.html')
+
+
+@bp.route('/shows/<show_id>', methods=['DELETE'])
+def delete_show(show_id):
+    error = False
+    try:
+        show = Show.query.get(show_id)
+        tags = ('shows', 'venues', 'venue:%s' % show.venue_id, 'artist:%s' % show.artist_id)
+        db.session.delete(show)
+        db.session.commit()
+        invalidate(*tags)
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+        if error:
+            flash('An error occurred. Show could not be deleted.')
+        else:
+            flash('Show was successfully deleted!')
+    return jsonify({ 'success': not error })
@@ -0,0 +1,188 @@
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+import sys
+
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, abort, current_app
+
+from models import db, Genre, Venue
+import queries
+import read_models
+from parallel import gather
+from profiler import query_budget
+from cache import cached_page, invalidate
+
+bp = Blueprint('venues', __name__)
+
+# the most rows one page of a venue/artist search returns
+MAX_SEARCH_PAGE_SIZE = 100
+
+
+@bp.route('/venues')
+@query_budget(1)
+@cached_page(lambda: ('venues',))
+def venues():
+    # TODO: replace with real venues data.
+    #       num_shows should be aggregated based on number of upcoming shows per venue.
+    data = queries.venue_areas(genre=request.args.get('genre'))
+    return render_template('pages/venues.html', areas=data)
+
+
+def search_page():
+    # limit/offset for a page of search results, posted alongside search_term
+    limit = min(request.form.get('limit', current_app.config['SEARCH_PAGE_SIZE'], type=int),
+                MAX_SEARCH_PAGE_SIZE)
+    offset = request.form.get('offset', 0, type=int)
+    if limit < 1 or offset < 0:
+        abort(400)
+    return {'limit': limit, 'offset': offset}
+
+
+@bp.route('/venues/search', methods=['POST'])
+@query_budget(2)
+def search_venues():
+    # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+    # seach for Hop should return "The Musical Hop".
+    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+    term =request.form.get('search_term', '').lower()
+    response = queries.search_venues(term, **search_page())
+    return render_template('pages/search_venues.html', results=response, search_term=term)
+
+
+@bp.route('/venues/<int:venue_id>')
+@query_budget(3)
+@cached_page(lambda venue_id: ('venue:%d' % venue_id, 'venue-pages'))
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    venue, genres, shows = gather(
+        lambda: read_models.venue(venue_id, genres=False),
+        lambda: read_models.venue_genres_of(venue_id),
+        lambda: queries.venue_shows(venue_id))
+    if venue is None:
+        abort(404)
+    venue_dto = venue._replace(genres=genres).dictionary()
+    venue_dto.update(shows)
+    return render_template('pages/show_venue.html', venue=venue_dto)
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+    from forms import VenueForm
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+    # TODO: insert form data as a new Venue record in the db, instead
+    # TODO: modify data to be the data object returned from db insertion
+    error = False
+    try:
+        venue = Venue()
+        venue.name = request.form['name']
+        venue.city = request.form['city']
+        venue.state = request.form['state']
+        venue.phone = request.form['phone']
+        venue.address = request.form['address']
+        venue.genres = Genre.named(request.form.getlist('genres'))
+        venue.webpage_link = request.form['webpage_link']
+        venue.image_link = request.form['image_link']
+        venue.facebook_link = request.form['facebook_link']
+        venue.description = request.form['description']
+        venue.seeking_talent = True
+        if not venue.description:
+            venue.seeking_talent = False
+        db.session.add(venue)
+        db.session.commit()
+        invalidate('venues')
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+        if error:
+            flash('An error occurred. Artist ' +
+                  request.form['name'] + ' could not be listed.')
+        else:
+            flash('Venue ' + request.form['name'] +
+                  ' was successfully listed!')
+        return render_template('pages/home.html')
+
+
+@bp.route('/venues/<venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+    # TODO: Complete this endpoint for taking a venue_id, and using
+    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    error = False
+    try:
+        venue = Venue.query.get(venue_id)
+        db.session.delete(venue)
+        db.session.commit()
+        invalidate('venues', 'venue:%s' % venue_id, 'shows', 'artist-pages')
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+        if error:
+            flash('An error occurred. Venue could not be deleted.')
+        else:
+            flash('Venue ' + venue.name +' was successfully deleted!')
+    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+    # clicking that button delete it from the db then redirect the user to the homepage
+    return jsonify({ 'success': True })
+
+#  Update
+#  ----------------------------------------------------------------
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+    from forms import VenueForm
+    form = VenueForm()
+    venue = Venue.query.get(venue_id)
+    # TODO: populate form with values from venue with ID <venue_id>
+    return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+    # TODO: take values from the form submitted, and update existing
+    # venue record with ID <venue_id> using the new attributes
+    error = False
+    try:
+        venue = Venue.query.get(venue_id)
+        venue.name = request.form['name']
+        venue.city = request.form['city']
+        venue.state = request.form['state']
+        venue.phone = request.form['phone']
+        venue.address = request.form['address']
+        venue.genres = Genre.named(request.form.getlist('genres'))
+        venue.webpage_link = request.form['webpage_link']
+        venue.image_link = request.form['image_link']
+        venue.facebook_link = request.form['facebook_link']
+        venue.description = request.form['description']
+        venue.seeking_talent = True
+        if not venue.description:
+            venue.seeking_talent = False
+        db.session.commit()
+        invalidate('venues', 'venue:%s' % venue_id, 'shows', 'artist-pages')
+    except:
+        error = True
+        db.session.rollback()
+        print(sys.exc_info())
+    finally:
+        db.session.close()
+        if error:
+            flash('An error occurred. Venue ' +
+                  request.form['name'] + ' could not be listed.')
+        else:
+            flash('Venue ' + request.form['name'] +
+                  ' was successfully listed!')
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
@@ -1,21 +1,31 @@
 import os
-from sqlalchemy import Column, String, Integer
+import sys
+from sqlalchemy import Column, String, Integer, JSON, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import validates
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+# the repository's shared/ package (pool settings and metrics)
+sys.path.append(os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', '..', '..', '..', '..', '..')))
+from shared import db_settings
+
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = "sqlite:///{}".format(os.path.join(project_dir, database_filename))
+database_path = db_settings.database_uri(
+    "sqlite:///{}".format(os.path.join(project_dir, database_filename)))
 
 db = SQLAlchemy()
 
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    pool sizes and timeouts come from the DB_* environment variables,
+    pool metrics are served at /metrics
 '''
 def setup_db(app):
-    app.config["SQLALCHEMY_DATABASE_URI"] = database_path
-    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db_settings.configure(app, database_path)
     db.app = app
     db.init_app(app)
 
@@ -38,33 +48,58 @@ class Drink(db.Model):
     id = Column(Integer().with_variant(Integer, "sqlite"), primary_key=True)
     # String Title
     title = Column(String(80), unique=True)
-    # the ingredients blob - this stores a lazy json blob
+    # the ingredients blob - a json column (jsonb on postgres, json text on sqlite)
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
-    recipe =  Column(String(180), nullable=False)
+    # a json string is parsed once, when assigned; assign a new list to change it
+    recipe = Column(JSON().with_variant(JSONB(), 'postgresql'), nullable=False)
+
+    @validates('title', 'recipe')
+    def validate(self, key, value):
+        if key == 'recipe' and isinstance(value, str):
+            value = json.loads(value)
+        self.forget_projections()
+        return value
+
+    '''
+    projections()
+        the (short, long) representations, built once per loaded drink
+        and dropped when it changes or is committed
+    '''
+    def projections(self):
+        projections = self.__dict__.get('_projections')
+        if projections is None:
+            recipe = self.recipe
+            short = {
+                'id': self.id,
+                'title': self.title,
+                'recipe': [{'color': r['color'], 'parts': r['parts']} for r in recipe]
+            }
+            long = {
+                'id': self.id,
+                'title': self.title,
+                'recipe': recipe
+            }
+            projections = self._projections = (short, long)
+        return projections
+
+    def forget_projections(self):
+        self.__dict__.pop('_projections', None)
 
     '''
     short()
         short form representation of the Drink model
+        the dict is shared by later calls; do not modify it
     '''
     def short(self):
-        print(json.loads(self.recipe))
-        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in json.loads(self.recipe)]
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': short_recipe
-        }
+        return self.projections()[0]
 
     '''
     long()
         long form representation of the Drink model
+        the dict is shared by later calls; do not modify it
     '''
     def long(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'recipe': json.loads(self.recipe)
-        }
+        return self.projections()[1]
 
     '''
     insert()
@@ -101,7 +136,19 @@ class Drink(db.Model):
             drink.update()
     '''
     def update(self):
+        self.forget_projections()
         db.session.commit()
 
     def __repr__(self):
-        return json.dumps(self.short())
\ No newline at end of file
+        return '<Drink {} {}>'.format(self.id, self.title)
+
+
+# commits and refreshes expire the columns, and with them the projections
+@event.listens_for(Drink, 'expire')
+def expire_projections(drink, attrs):
+    drink.forget_projections()
+
+
+@event.listens_for(Drink, 'refresh')
+def refresh_projections(drink, context, attrs):
+    drink.forget_projections()
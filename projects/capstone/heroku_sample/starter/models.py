@@ -1,7 +1,13 @@
-from sqlalchemy import Column, String, create_engine
+import os
+import sys
+from sqlalchemy import Column, String, Integer, create_engine
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+# the repository's shared/ package (pool settings and metrics)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')))
+from shared import db_settings
+
 database_path = os.environ['DATABASE_URL']
 
 db = SQLAlchemy()
@@ -9,10 +15,11 @@ db = SQLAlchemy()
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    pool sizes and timeouts come from the DB_* environment variables,
+    pool metrics are served at /metrics
 '''
 def setup_db(app, database_path=database_path):
-    app.config["SQLALCHEMY_DATABASE_URI"] = database_path
-    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db_settings.configure(app, database_path)
     db.app = app
     db.init_app(app)
     db.create_all()
@@ -0,0 +1,4 @@
+# Helpers shared by the apps in this repository. The apps live in their own
+# directories and put the repository root on sys.path to import this package.
+#
+# Tests: python -m unittest shared.test_shared (from the repository root).
@@ -0,0 +1,153 @@
+#----------------------------------------------------------------------------#
+# Micro-benchmarks for the shared helpers.
+#
+#   python shared/benchmarks.py            # run all
+#   python shared/benchmarks.py token      # run the ones whose name contains "token"
+#
+# Tokens come from an issuer.LocalIssuer, an RSA key generated at start-up,
+# so nothing here needs network access or an Auth0 tenant. bench_requires_auth
+# runs the apps' own requires_auth decorators with AUTH_ISSUER=local. Needs
+# Flask and python-jose, best with its cryptography backend.
+#----------------------------------------------------------------------------#
+
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def timed(fn, repeat=5):
+    # best of `repeat` runs, in milliseconds
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_token_cache(num_tokens=50, requests=5000):
+    from jose import jwt
+    from shared.issuer import LocalIssuer
+    from shared.token_cache import TokenCache
+
+    local = LocalIssuer('bench', 'bench')
+    key = local.jwk()
+    tokens = [local.mint(sub='user|%d' % i) for i in range(num_tokens)]
+
+    def decode(token):
+        return jwt.decode(token, key, algorithms=['RS256'], audience='bench',
+                          issuer='https://bench/')
+
+    # the same token reused: clients send theirs with every request
+    rng = random.Random(0)
+    workload = [rng.choice(tokens) for _ in range(requests)]
+    print('token decode: %d requests over %d tokens' % (requests, num_tokens))
+
+    start = time.perf_counter()
+    for token in workload:
+        decode(token)
+    uncached = time.perf_counter() - start
+    print('  jwt.decode        %8.0f/s  %.3f ms each'
+          % (requests / uncached, uncached * 1000 / requests))
+
+    cache = TokenCache()
+    start = time.perf_counter()
+    for token in workload:
+        cache.verify(token, decode)
+    cached = time.perf_counter() - start
+    print('  TokenCache.verify %8.0f/s  %.3f ms each, hit rate %.1f%%'
+          % (requests / cached, cached * 1000 / requests, cache.stats()['hit_rate'] * 100))
+
+    start = time.perf_counter()
+    for token in workload:
+        cache.verify(token, decode)
+    warm = time.perf_counter() - start
+    print('  warm cache        %8.0f/s  %.4f ms each'
+          % (requests / warm, warm * 1000 / requests))
+
+
+def bench_permission_check(sizes=(5, 50, 500), checks=100000):
+    from shared.permissions import Requirement, granted
+
+    print('permission check: %d checks of the last permission in the claim' % checks)
+    for size in sizes:
+        claim = ['action:%d' % i for i in range(size)]
+        wanted = claim[-1]
+        start = time.perf_counter()
+        for _ in range(checks):
+            wanted in claim
+        listed = time.perf_counter() - start
+        requirement, permissions = Requirement(all_of=[wanted]), granted({'permissions': claim})
+        start = time.perf_counter()
+        for _ in range(checks):
+            requirement.satisfied_by(permissions)
+        compiled = time.perf_counter() - start
+        print('  %4d permissions: list %.3f us, Requirement %.3f us'
+              % (size, listed * 1e6 / checks, compiled * 1e6 / checks))
+
+
+def bench_mint(count=200):
+    # LocalIssuer.mint builds its key once; jwt.encode given the PEM parses
+    # it for every token
+    from jose import jwt
+    from shared.issuer import LocalIssuer, save_key
+
+    for bits in (1024, 2048):
+        local = LocalIssuer(bits=bits)
+        pem = save_key(local.key)
+        minted = timed(lambda: [local.mint(['get:drinks'], sub=str(i)) for i in range(count)], 3)
+        encoded = timed(lambda: [jwt.encode(
+            {'sub': str(i), 'permissions': ['get:drinks']}, pem, algorithm='RS256',
+            headers={'kid': local.kid}) for i in range(count)], 3)
+        print('mint %d-bit: LocalIssuer.mint %.0f/s, jwt.encode(pem) %.0f/s'
+              % (bits, count * 1000 / minted, count * 1000 / encoded))
+
+
+def bench_requires_auth(num_tokens=100, requests=2000):
+    # the decorators exactly as the apps use them; the view does nothing
+    os.environ['AUTH_ISSUER'] = 'local'
+    os.environ.pop('AUTH_ISSUER_KEY', None)
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    sys.path.append(os.path.join(root, 'BasicFlaskAuth'))
+    sys.path.append(os.path.join(root, 'projects', '03_coffee_shop_full_stack',
+                                 'starter_code', 'backend'))
+    import app as basic
+    from flask import Flask
+    from src.auth import auth as coffee
+
+    def view(payload):
+        return payload
+
+    apps = [
+        ('BasicFlaskAuth', basic, basic.app, basic.requires_auth(view), None),
+        ('coffee shop', coffee, Flask(__name__),
+         coffee.requires_auth(any_of=['get:drinks-detail', 'post:drinks'])(view),
+         ['get:drinks-detail']),
+    ]
+    print('requires_auth: %d requests' % requests)
+    for name, module, flask_app, protected, permissions in apps:
+        tokens = [module.ISSUER.mint(permissions, sub='user|%d' % i) for i in range(num_tokens)]
+        for label, workload in (
+                ('new token each request', [tokens[i % num_tokens] for i in range(num_tokens)]),
+                ('%d tokens reused' % num_tokens, [tokens[i % num_tokens] for i in range(requests)])):
+            module.TOKENS.clear()
+            start = time.perf_counter()
+            for token in workload:
+                with flask_app.test_request_context(headers={'Authorization': 'Bearer ' + token}):
+                    protected()
+            elapsed = time.perf_counter() - start
+            print('  %-15s %-24s %8.0f/s  %.3f ms each'
+                  % (name, label, len(workload) / elapsed, elapsed * 1000 / len(workload)))
+
+
+BENCHMARKS = [bench_token_cache, bench_permission_check, bench_mint, bench_requires_auth]
+
+if __name__ == '__main__':
+    selected = sys.argv[1:]
+    for bench in BENCHMARKS:
+        if not selected or any(name in bench.__name__ for name in selected):
+            bench()
@@ -0,0 +1,263 @@
+#----------------------------------------------------------------------------#
+# Database settings shared by the project apps.
+#
+# configure(app) sets an app's SQLAlchemy engine options from the environment
+# and serves pool metrics at /metrics. database_uri(default) is the database
+# to use:
+#
+#   DATABASE_URL          the database; the app's default when unset
+#   DB_POOL_SIZE          connections kept open (default 5)
+#   DB_MAX_OVERFLOW       extra connections opened under load (default 10)
+#   DB_POOL_TIMEOUT       seconds to wait for a free connection (default 30)
+#   DB_POOL_RECYCLE       seconds before a connection is replaced (default 1800)
+#   DB_POOL_PRE_PING      test connections on checkout (default on)
+#   DB_STATEMENT_TIMEOUT  milliseconds a statement may run, 0 for no limit
+#                         (default 0; PostgreSQL only)
+#
+# An in-memory SQLite database lives on one connection, so it gets no pool
+# sizes. Pool metrics come from a QueuePool (or StaticPool) subclass that
+# times every checkout: checkout latency, saturation (connections in use
+# over pool size plus overflow), and connection errors, in the Prometheus
+# text format.
+#----------------------------------------------------------------------------#
+
+import os
+import threading
+import time
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool, StaticPool
+
+DEFAULTS = {
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PRE_PING': True,
+    'DB_STATEMENT_TIMEOUT': 0,
+}
+
+# QueuePool's max_overflow when none is given
+DEFAULT_MAX_OVERFLOW = 10
+
+# upper bounds, in seconds, of the checkout latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+def setting(name, environ=None):
+    environ = os.environ if environ is None else environ
+    default = DEFAULTS[name]
+    value = environ.get(name)
+    if value is None or value.strip() == '':
+        return default
+    if isinstance(default, bool):
+        return value.strip().lower() not in ('0', 'false', 'no', 'off')
+    return int(value)
+
+
+def database_uri(default=None, environ=None):
+    environ = os.environ if environ is None else environ
+    return environ.get('DATABASE_URL') or default
+
+
+def in_memory(uri):
+    url = make_url(uri)
+    return url.drivername.startswith('sqlite') and url.database in (None, '', ':memory:')
+
+
+def engine_options(uri, metrics=None, environ=None):
+    '''
+    create_engine() keyword arguments for uri from the DB_* environment
+    variables. With metrics, the pool reports to it.
+    '''
+    options = {
+        'pool_pre_ping': setting('DB_POOL_PRE_PING', environ),
+        'pool_recycle': setting('DB_POOL_RECYCLE', environ),
+    }
+    if in_memory(uri):
+        pool_class = StaticPool
+    else:
+        pool_class = QueuePool
+        options.update(
+            pool_size=setting('DB_POOL_SIZE', environ),
+            max_overflow=setting('DB_MAX_OVERFLOW', environ),
+            pool_timeout=setting('DB_POOL_TIMEOUT', environ),
+        )
+    if metrics is not None:
+        options['poolclass'] = metrics.pool_class(pool_class)
+
+    drivername = make_url(uri).drivername
+    timeout = setting('DB_STATEMENT_TIMEOUT', environ)
+    if timeout and drivername.startswith('postgres'):
+        options['connect_args'] = {'options': '-c statement_timeout=%d' % timeout}
+    elif drivername.startswith('sqlite') and pool_class is QueuePool:
+        # pooled connections move between threads, one thread at a time
+        options['connect_args'] = {'check_same_thread': False}
+    return options
+
+
+class PoolMetrics(object):
+    '''
+    Checkout counts and latencies, connection errors and in-use connections
+    of every pool created from pool_class(). Thread safe.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pools = weakref.WeakSet()
+        self.checkouts = 0
+        self.checkout_seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.errors = 0  # failed checkouts: pool timeouts and failed connects
+        self.invalidated = 0  # connections found dead (pre-ping) or dropped
+        self.peak = 0  # most connections in use at once
+
+    def pool_class(self, base):
+        '''
+        A subclass of the pool class base reporting to these metrics. Pools
+        re-created after a dispose() keep the class, and so keep reporting.
+        '''
+        metrics = self
+
+        class MeteredPool(base):
+
+            def __init__(self, *args, **kwargs):
+                # as configured, for capacity(); recreate() passes it again
+                self.max_overflow = kwargs.get('max_overflow', DEFAULT_MAX_OVERFLOW)
+                super().__init__(*args, **kwargs)
+
+            def _do_get(self):
+                started = time.perf_counter()
+                try:
+                    connection = super()._do_get()
+                except Exception:
+                    metrics.failed()
+                    raise
+                metrics.checked_out(self, time.perf_counter() - started)
+                return connection
+
+        event.listen(MeteredPool, 'invalidate', self.invalidate)
+        return MeteredPool
+
+    def checked_out(self, pool, seconds):
+        with self.lock:
+            self.pools.add(pool)
+            self.checkouts += 1
+            self.checkout_seconds += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self.buckets[i] += 1
+                    break
+            self.peak = max(self.peak, in_use(pool))
+
+    def failed(self):
+        with self.lock:
+            self.errors += 1
+
+    def invalidate(self, dbapi_connection, connection_record, exception):
+        with self.lock:
+            self.invalidated += 1
+
+    def in_use(self):
+        return sum(in_use(pool) for pool in list(self.pools))
+
+    def capacity(self):
+        return sum(capacity(pool) for pool in list(self.pools))
+
+    def saturation(self):
+        total = self.capacity()
+        return self.in_use() / total if total else 0.0
+
+    def render(self):
+        '''
+        The metrics in the Prometheus text exposition format.
+        '''
+        with self.lock:
+            lines = [
+                '# HELP db_pool_checkout_seconds Time to get a connection from the pool.',
+                '# TYPE db_pool_checkout_seconds histogram',
+            ]
+            count = 0
+            for bound, hits in zip(LATENCY_BUCKETS, self.buckets):
+                count += hits
+                lines.append('db_pool_checkout_seconds_bucket{le="%g"} %d' % (bound, count))
+            lines += [
+                'db_pool_checkout_seconds_bucket{le="+Inf"} %d' % self.checkouts,
+                'db_pool_checkout_seconds_sum %f' % self.checkout_seconds,
+                'db_pool_checkout_seconds_count %d' % self.checkouts,
+                '# HELP db_pool_connection_errors_total Checkouts that failed to get a connection.',
+                '# TYPE db_pool_connection_errors_total counter',
+                'db_pool_connection_errors_total %d' % self.errors,
+                '# HELP db_pool_invalidations_total Connections discarded as broken.',
+                '# TYPE db_pool_invalidations_total counter',
+                'db_pool_invalidations_total %d' % self.invalidated,
+                '# HELP db_pool_peak_connections Most connections checked out at once.',
+                '# TYPE db_pool_peak_connections gauge',
+                'db_pool_peak_connections %d' % self.peak,
+            ]
+        lines += [
+            '# HELP db_pool_connections Connections checked out now.',
+            '# TYPE db_pool_connections gauge',
+            'db_pool_connections %d' % self.in_use(),
+            '# HELP db_pool_capacity Pool size plus overflow.',
+            '# TYPE db_pool_capacity gauge',
+            'db_pool_capacity %d' % self.capacity(),
+            '# HELP db_pool_saturation Connections checked out over capacity.',
+            '# TYPE db_pool_saturation gauge',
+            'db_pool_saturation %f' % self.saturation(),
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def in_use(pool):
+    if isinstance(pool, QueuePool):
+        return pool.checkedout()
+    # a StaticPool's one connection, shared by every checkout once opened
+    return 1 if 'connection' in vars(pool) else 0
+
+
+def capacity(pool):
+    if isinstance(pool, QueuePool):
+        if pool.max_overflow < 0:
+            # no overflow limit: the overflow connections open now
+            return pool.size() + max(pool.overflow(), 0)
+        return pool.size() + pool.max_overflow
+    return 1
+
+
+#  Flask apps
+#  ----------------------------------------------------------------
+
+def metrics_view():
+    from flask import current_app
+    return current_app.extensions['pool_metrics'].render(), 200, {
+        'Content-Type': 'text/plain; version=0.0.4'}
+
+
+def configure(app, uri=None, environ=None):
+    '''
+    Sets app's database URI (when given) and engine options, and adds
+    /metrics. Call before db.init_app(app). Engine options already in the
+    config win, except those set by an earlier call: calling it again (say
+    with a test database) redoes the options for the new URI and keeps the
+    app's PoolMetrics and /metrics.
+    '''
+    if uri is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+
+    metrics = app.extensions.get('pool_metrics')
+    if metrics is None:
+        metrics = app.extensions['pool_metrics'] = PoolMetrics()
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
+    previous = app.extensions.get('db_engine_options', {})
+    overrides = {name: value for name, value in
+                 (app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}).items()
+                 if name not in previous or previous[name] is not value}
+    options = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], metrics, environ)
+    app.extensions['db_engine_options'] = dict(options)
+    options.update(overrides)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    return metrics
@@ -0,0 +1,204 @@
+#----------------------------------------------------------------------------#
+# Token issuers.
+#
+# An issuer is what the apps verify bearer tokens against: its URL (the iss
+# claim), the API audience (aud) and a fetcher of its signing keys for
+# jwks.JWKSProvider.
+#
+#   Auth0Issuer -- an Auth0 tenant; keys from its /.well-known/jwks.json, or
+#                  JWKS_FILE when set
+#   LocalIssuer -- an RSA key pair held in-process, standing in for both the
+#                  tenant and its JWKS endpoint: fetcher() returns the key
+#                  set from memory, and mint() signs tokens with any claims
+#                  and permissions. For tests and offline load tests.
+#
+# from_environ() picks the issuer: Auth0 unless AUTH_ISSUER=local. A local
+# issuer keeps its private key in AUTH_ISSUER_KEY (a PEM file, created if
+# missing) when set, so another process can mint tokens the app accepts:
+#
+#   AUTH_ISSUER=local AUTH_ISSUER_KEY=/tmp/issuer.pem flask run
+#   python shared/issuer.py --key /tmp/issuer.pem --domain ... get:drinks
+#
+# mint() is jwt.encode with the key built once per issuer. Install
+# python-jose[cryptography]: over python-jose's pure-Python rsa backend,
+# signing (and generating keys) is far slower. Tests that mint many tokens
+# can mint them once up front, or use a smaller key (bits).
+#----------------------------------------------------------------------------#
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+from jose import jwk, jwt
+
+if __name__ == '__main__':
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shared import jwks
+
+RSAKey = namedtuple('RSAKey', 'n e d p q')
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def b64_int(value):
+    return b64(value.to_bytes((value.bit_length() + 7) // 8, 'big'))
+
+
+#  RSA keys
+#  ----------------------------------------------------------------
+
+# with cryptography when installed, else with the rsa package python-jose
+# depends on
+
+def from_numbers(private):
+    numbers = private.private_numbers()
+    return RSAKey(numbers.public_numbers.n, numbers.public_numbers.e, numbers.d,
+                  numbers.p, numbers.q)
+
+
+def generate_key(bits=2048):
+    try:
+        from cryptography.hazmat.primitives.asymmetric import rsa
+    except ImportError:
+        import rsa
+        public, private = rsa.newkeys(bits)
+        return RSAKey(private.n, private.e, private.d, private.p, private.q)
+    return from_numbers(rsa.generate_private_key(public_exponent=65537, key_size=bits))
+
+
+def load_key(pem):
+    try:
+        from cryptography.hazmat.primitives import serialization
+    except ImportError:
+        import rsa
+        private = rsa.PrivateKey.load_pkcs1(pem)
+        return RSAKey(private.n, private.e, private.d, private.p, private.q)
+    return from_numbers(serialization.load_pem_private_key(pem, password=None))
+
+
+def save_key(key):
+    # PKCS#1 PEM, which jwt.encode also accepts
+    try:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+    except ImportError:
+        import rsa
+        return rsa.PrivateKey(*key).save_pkcs1()
+    n, e, d, p, q = key
+    private = rsa.RSAPrivateNumbers(
+        p, q, d, rsa.rsa_crt_dmp1(d, p), rsa.rsa_crt_dmq1(d, q), rsa.rsa_crt_iqmp(p, q),
+        rsa.RSAPublicNumbers(e, n)).private_key()
+    return private.private_bytes(serialization.Encoding.PEM,
+                                 serialization.PrivateFormat.TraditionalOpenSSL,
+                                 serialization.NoEncryption())
+
+
+def key_from_file(path, bits=2048):
+    if os.path.exists(path):
+        with open(path, 'rb') as stream:
+            return load_key(stream.read())
+    key = generate_key(bits)
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as stream:
+        stream.write(save_key(key))
+    return key
+
+
+#  Issuers
+#  ----------------------------------------------------------------
+
+class Auth0Issuer(object):
+
+    def __init__(self, domain, audience, environ=None):
+        self.domain = domain
+        self.audience = audience
+        self.issuer = 'https://%s/' % domain
+        self.environ = environ
+
+    def fetcher(self):
+        return jwks.default_fetcher(self.domain, self.environ)
+
+
+class LocalIssuer(object):
+    '''
+    Issues RS256 tokens for issuer https://<domain>/ and audience, signed
+    with key (generated when not given) under key id kid.
+    '''
+
+    def __init__(self, domain='local.test', audience='local', key=None, bits=2048,
+                 kid='local'):
+        self.domain = domain
+        self.audience = audience
+        self.issuer = 'https://%s/' % domain
+        self.key = key if key is not None else generate_key(bits)
+        self.kid = kid
+        # parsed once rather than by every jwt.encode
+        self.signing_key = jwk.construct(save_key(self.key), 'RS256')
+
+    def jwk(self):
+        return {'kty': 'RSA', 'kid': self.kid, 'use': 'sig', 'alg': 'RS256',
+                'n': b64_int(self.key.n), 'e': b64_int(self.key.e)}
+
+    def jwks(self):
+        return {'keys': [self.jwk()]}
+
+    def fetcher(self):
+        # the JWKS endpoint, without the network
+        return self.jwks
+
+    def write_jwks(self, path):
+        '''
+        Writes the key set for JWKS_FILE.
+        '''
+        with open(path, 'w') as stream:
+            json.dump(self.jwks(), stream)
+
+    def mint(self, permissions=None, ttl=3600, **claims):
+        '''
+        A signed token valid for ttl seconds; permissions (a list of strings)
+        becomes the permissions claim, other claims override the defaults.
+        '''
+        now = int(time.time())
+        payload = {'iss': self.issuer, 'aud': self.audience, 'sub': 'local|user',
+                   'iat': now, 'exp': now + ttl}
+        if permissions is not None:
+            payload['permissions'] = list(permissions)
+        payload.update(claims)
+        return jwt.encode(payload, self.signing_key, algorithm='RS256',
+                          headers={'kid': self.kid})
+
+
+def from_environ(domain, audience, environ=None):
+    '''
+    The issuer for an app configured with Auth0 domain and audience: a
+    LocalIssuer using them when AUTH_ISSUER=local, else Auth0.
+    '''
+    environ = os.environ if environ is None else environ
+    if environ.get('AUTH_ISSUER', 'auth0').strip().lower() != 'local':
+        return Auth0Issuer(domain, audience, environ)
+    key = None
+    if environ.get('AUTH_ISSUER_KEY'):
+        key = key_from_file(environ['AUTH_ISSUER_KEY'])
+    return LocalIssuer(domain, audience, key)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Mint tokens signed with a local issuer key, one per line.')
+    parser.add_argument('permissions', nargs='*')
+    parser.add_argument('--key', default=os.environ.get('AUTH_ISSUER_KEY'), required=(
+        not os.environ.get('AUTH_ISSUER_KEY')), help='private key PEM, created if missing')
+    parser.add_argument('--domain', default=os.environ.get('AUTH0_DOMAIN', 'local.test'))
+    parser.add_argument('--audience', default=os.environ.get('API_AUDIENCE', 'local'))
+    parser.add_argument('--ttl', type=int, default=3600)
+    parser.add_argument('--count', type=int, default=1)
+    args = parser.parse_args()
+    local = LocalIssuer(args.domain, args.audience, key_from_file(args.key))
+    for i in range(args.count):
+        print(local.mint(args.permissions, args.ttl, sub='local|user%d' % i))
@@ -0,0 +1,139 @@
+#----------------------------------------------------------------------------#
+# JSON Web Key Set cache for token verification.
+#
+# A JWKSProvider keeps the signing keys of an issuer in memory, by key id
+# (kid), so verifying a token does not fetch the key set. The set is
+# refetched:
+#
+#   - by a background thread, before the cached set is ttl seconds old;
+#   - inline, when the set is older than ttl and no refresh has succeeded;
+#   - when a token names a kid the set does not have (the issuer rotated its
+#     keys), at most once per min_refetch_interval seconds, so tokens with
+#     made-up kids cannot make us hammer the issuer.
+#
+# A failed fetch keeps the keys we have, so a JWKS outage does not fail
+# tokens signed with known keys.
+#
+# Fetchers are functions returning the parsed key set ({'keys': [...]}):
+# url_fetcher() reads it over HTTP, file_fetcher() from a local file for
+# tests and offline runs. default_fetcher() picks the JWKS_FILE environment
+# variable when set, else the issuer's /.well-known/jwks.json.
+#----------------------------------------------------------------------------#
+
+import json
+import logging
+import os
+import threading
+import time
+from urllib.request import urlopen
+
+logger = logging.getLogger(__name__)
+
+
+def url_fetcher(url, timeout=5):
+    def fetch():
+        with urlopen(url, timeout=timeout) as response:
+            return json.loads(response.read())
+    return fetch
+
+
+def file_fetcher(path):
+    def fetch():
+        with open(path) as stream:
+            return json.load(stream)
+    return fetch
+
+
+def auth0_fetcher(domain):
+    return url_fetcher('https://%s/.well-known/jwks.json' % domain)
+
+
+def default_fetcher(domain, environ=None):
+    environ = os.environ if environ is None else environ
+    if environ.get('JWKS_FILE'):
+        return file_fetcher(environ['JWKS_FILE'])
+    return auth0_fetcher(domain)
+
+
+class JWKSProvider(object):
+    '''
+    kid -> JWK dict cache over fetcher. Thread safe; with background set, a
+    refresh thread starts after the first lookup.
+    '''
+
+    def __init__(self, fetcher, ttl=600, min_refetch_interval=30, background=True,
+                 clock=time.monotonic):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.min_refetch_interval = min_refetch_interval
+        self.background = background
+        self.clock = clock
+        self.keys = {}
+        self.fetched_at = None  # last successful fetch
+        self.attempted_at = None  # last fetch, successful or not
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.fetches = 0
+        self.errors = 0
+
+    def get_key(self, kid):
+        '''
+        The JWK with key id kid, or None if the issuer does not have it.
+        '''
+        if self.fetched_at is None or self.clock() - self.fetched_at >= self.ttl:
+            self.refresh(self.min_refetch_interval)
+        key = self.keys.get(kid)
+        if key is None:
+            self.refresh(self.min_refetch_interval)
+            key = self.keys.get(kid)
+        self.start()
+        return key
+
+    def refresh(self, unless_within=0):
+        '''
+        Fetches the key set, unless a fetch was attempted less than
+        unless_within seconds ago. Returns whether the keys were replaced.
+        '''
+        with self.lock:
+            now = self.clock()
+            if self.attempted_at is not None and now - self.attempted_at < unless_within:
+                return False
+            self.attempted_at = now
+            self.fetches += 1
+            try:
+                keys = {key['kid']: key for key in self.fetcher()['keys'] if 'kid' in key}
+            except Exception:
+                self.errors += 1
+                logger.exception('fetching the JWKS failed; keeping %d cached keys',
+                                  len(self.keys))
+                return False
+            self.keys = keys
+            self.fetched_at = self.clock()
+            return True
+
+    #  Background refresh
+    #  ----------------------------------------------------------------
+
+    def start(self):
+        if not self.background or self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='jwks-refresh', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        # refresh at 90% of the ttl, so lookups find the set fresh; after a
+        # failed fetch, retry once min_refetch_interval has passed
+        while True:
+            due = self.clock() if self.fetched_at is None else self.fetched_at + self.ttl * 0.9
+            if self.attempted_at is not None and (
+                    self.fetched_at is None or self.attempted_at > self.fetched_at):
+                due = max(due, self.attempted_at + self.min_refetch_interval)
+            if self.stopped.wait(max(due - self.clock(), 0)):
+                return
+            self.refresh()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,60 @@
+#----------------------------------------------------------------------------#
+# Permission checks against a token's permissions claim.
+#
+# granted(payload) turns the claim (Auth0 RBAC's list of strings) into a
+# frozenset once per token; TokenCache(prepare=granted) keeps it with the
+# cached payload, so later requests with the token reuse it. A Requirement
+# is built once per decorated view:
+#
+#   Requirement(all_of=['get:drinks-detail'])
+#   Requirement(any_of=['patch:drinks', 'post:drinks'])
+#   Requirement(all_of=['get:drinks'], any_of=['patch:drinks', 'delete:drinks'])
+#
+# satisfied_by() costs one set lookup per permission the requirement names,
+# whatever the number of permissions in the token.
+#----------------------------------------------------------------------------#
+
+
+def granted(payload):
+    '''
+    The token's permissions as a frozenset, or None if payload has no
+    permissions claim.
+    '''
+    permissions = payload.get('permissions')
+    if not isinstance(permissions, (list, tuple)):
+        return None
+    return frozenset(permissions)
+
+
+class Requirement(object):
+    '''
+    Holds when a token has every permission in all_of and, if any_of is not
+    empty, at least one of any_of. The empty requirement always holds.
+    '''
+
+    def __init__(self, all_of=(), any_of=()):
+        self.all_of = frozenset(all_of)
+        self.any_of = frozenset(any_of)
+
+    def satisfied_by(self, permissions):
+        return self.all_of <= permissions and (
+            not self.any_of or not self.any_of.isdisjoint(permissions))
+
+    def __repr__(self):
+        return '<Requirement all_of=%s any_of=%s>' % (
+            sorted(self.all_of), sorted(self.any_of))
+
+
+def requirement(permission='', any_of=(), all_of=()):
+    '''
+    The Requirement of requires_auth(permission, any_of=..., all_of=...);
+    permission, if given, is one more all_of.
+    '''
+    if isinstance(permission, Requirement):
+        return permission
+    if isinstance(any_of, str) or isinstance(all_of, str):
+        raise TypeError('any_of and all_of take lists of permissions')
+    all_of = set(all_of)
+    if permission:
+        all_of.add(permission)
+    return Requirement(all_of, any_of)
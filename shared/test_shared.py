@@ -0,0 +1,277 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from shared import jwks, permissions
+from shared.token_cache import TokenCache, TokenRevoked
+from shared import issuer
+from shared.issuer import LocalIssuer
+
+# 1024 bits keeps key generation quick with the pure-Python rsa package
+ISSUER = LocalIssuer('issuer.test', 'tests', bits=1024)
+
+
+class Clock(object):
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class JWKSProviderTestCase(unittest.TestCase):
+    """The JWKS cache, fed by a LocalIssuer instead of an Auth0 tenant"""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.key_sets = [ISSUER.jwks()]
+        self.fail = False
+
+        def fetch():
+            if self.fail:
+                raise IOError('issuer unreachable')
+            return self.key_sets[-1]
+        self.provider = jwks.JWKSProvider(fetch, ttl=600, min_refetch_interval=30,
+                                          background=False, clock=self.clock)
+
+    def test_keys_cached(self):
+        self.assertEqual(self.provider.get_key('local'), ISSUER.jwk())
+        self.assertEqual(self.provider.get_key('local'), ISSUER.jwk())
+        self.assertEqual(self.provider.fetches, 1)
+
+    def test_unknown_kid_refetch_rate_limited(self):
+        self.provider.get_key('local')
+        self.assertIsNone(self.provider.get_key('made-up'))
+        self.clock.now += 10
+        self.assertIsNone(self.provider.get_key('made-up'))
+        self.assertEqual(self.provider.fetches, 1)
+        # the issuer rotates its keys; the new kid is found once the
+        # interval has passed
+        rotated = dict(ISSUER.jwk(), kid='rotated')
+        self.key_sets.append({'keys': [ISSUER.jwk(), rotated]})
+        self.clock.now += 30
+        self.assertEqual(self.provider.get_key('rotated'), rotated)
+        self.assertEqual(self.provider.fetches, 2)
+
+    def test_refreshed_after_ttl(self):
+        self.provider.get_key('local')
+        self.clock.now += 599
+        self.provider.get_key('local')
+        self.assertEqual(self.provider.fetches, 1)
+        self.key_sets.append({'keys': []})
+        self.clock.now += 1
+        self.assertIsNone(self.provider.get_key('local'))
+        self.assertEqual(self.provider.fetches, 2)
+
+    def test_failed_fetch_keeps_keys(self):
+        self.provider.get_key('local')
+        self.fail = True
+        self.clock.now += 600
+        with self.assertLogs('shared.jwks', 'ERROR'):
+            self.assertEqual(self.provider.get_key('local'), ISSUER.jwk())
+        self.assertEqual((self.provider.fetches, self.provider.errors), (2, 1))
+        # no retry until min_refetch_interval has passed
+        self.provider.get_key('local')
+        self.assertEqual(self.provider.fetches, 2)
+
+    def test_file_fetcher(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'jwks.json')
+            ISSUER.write_jwks(path)
+            fetcher = jwks.default_fetcher('issuer.test', {'JWKS_FILE': path})
+            self.assertEqual(fetcher(), json.loads(json.dumps(ISSUER.jwks())))
+            provider = jwks.JWKSProvider(fetcher, background=False)
+            self.assertEqual(provider.get_key('local')['n'], ISSUER.jwk()['n'])
+
+    def test_background_refresh(self):
+        provider = jwks.JWKSProvider(ISSUER.fetcher(), ttl=0.05, min_refetch_interval=0.01)
+        try:
+            provider.get_key('local')
+            time.sleep(0.2)
+            self.assertGreater(provider.fetches, 1)
+        finally:
+            provider.stop()
+            provider.thread.join(1)
+        self.assertFalse(provider.thread.is_alive())
+
+
+
+class TokenCacheTestCase(unittest.TestCase):
+    """Verified-token payloads kept until exp"""
+
+    def setUp(self):
+        self.clock = Clock(now=1000)
+        self.revoked = set()
+        self.decoded = []
+        self.cache = TokenCache(max_entries=2, clock=self.clock,
+                                revoked=lambda payload: payload['jti'] in self.revoked)
+
+    def decode(self, token):
+        # tokens are 'jti:exp'
+        self.decoded.append(token)
+        jti, exp = token.split(':')
+        return {'jti': jti, 'exp': int(exp)}
+
+    def test_hit(self):
+        payload = self.cache.verify('a:2000', self.decode)
+        self.assertIs(self.cache.verify('a:2000', self.decode), payload)
+        self.assertEqual(self.decoded, ['a:2000'])
+        self.assertEqual(self.cache.stats(), {
+            'entries': 1, 'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_evicted_at_exp(self):
+        self.cache.verify('a:2000', self.decode)
+        self.clock.now = 1999
+        self.cache.verify('a:2000', self.decode)
+        self.clock.now = 2000
+        self.cache.verify('a:2000', self.decode)
+        self.assertEqual(len(self.decoded), 2)
+
+    def test_least_recently_used_evicted(self):
+        for token in ('a:2000', 'b:2000', 'a:2000', 'c:2000', 'a:2000', 'b:2000'):
+            self.cache.verify(token, self.decode)
+        self.assertEqual(self.decoded, ['a:2000', 'b:2000', 'c:2000', 'b:2000'])
+
+    def test_revoked(self):
+        self.cache.verify('a:2000', self.decode)
+        self.revoked.add('a')
+        with self.assertRaises(TokenRevoked):
+            self.cache.verify('a:2000', self.decode)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+        self.revoked.add('b')
+        with self.assertRaises(TokenRevoked):
+            self.cache.verify('b:2000', self.decode)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_failures_not_cached(self):
+        def reject(token):
+            self.decoded.append(token)
+            raise ValueError('bad signature')
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.cache.verify('a:2000', reject)
+        self.assertEqual(len(self.decoded), 2)
+        # nor tokens without exp
+        self.cache.verify('b:2000', lambda token: {'jti': 'b'})
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_verifies_issued_tokens(self):
+        from jose import jwt
+        token = ISSUER.mint(ttl=60)
+        cache = TokenCache()
+
+        def decode(token):
+            return jwt.decode(token, ISSUER.jwk(), algorithms=['RS256'],
+                              audience=ISSUER.audience, issuer=ISSUER.issuer)
+        self.assertIs(cache.verify(token, decode), cache.verify(token, decode))
+        self.assertEqual(cache.stats()['hits'], 1)
+
+
+class PermissionsTestCase(unittest.TestCase):
+    """Requirements checked against a token's compiled permissions"""
+
+    def test_granted(self):
+        self.assertEqual(permissions.granted({'permissions': ['get:drinks', 'get:drinks']}),
+                         frozenset(['get:drinks']))
+        self.assertIsNone(permissions.granted({}))
+        self.assertIsNone(permissions.granted({'permissions': 'get:drinks'}))
+
+    def test_all_of_and_any_of(self):
+        granted = frozenset(['get:drinks', 'post:drinks'])
+        self.assertTrue(permissions.Requirement().satisfied_by(frozenset()))
+        self.assertTrue(permissions.Requirement(all_of=['get:drinks', 'post:drinks'])
+                        .satisfied_by(granted))
+        self.assertFalse(permissions.Requirement(all_of=['get:drinks', 'patch:drinks'])
+                         .satisfied_by(granted))
+        self.assertTrue(permissions.Requirement(any_of=['patch:drinks', 'post:drinks'])
+                        .satisfied_by(granted))
+        self.assertFalse(permissions.Requirement(any_of=['patch:drinks', 'delete:drinks'])
+                         .satisfied_by(granted))
+        both = permissions.Requirement(all_of=['get:drinks'], any_of=['patch:drinks'])
+        self.assertFalse(both.satisfied_by(granted))
+        self.assertTrue(both.satisfied_by(granted | {'patch:drinks'}))
+
+    def test_requirement(self):
+        requirement = permissions.requirement('post:drinks', any_of=['a', 'b'], all_of=['c'])
+        self.assertEqual(requirement.all_of, frozenset(['post:drinks', 'c']))
+        self.assertEqual(requirement.any_of, frozenset(['a', 'b']))
+        self.assertIs(permissions.requirement(requirement), requirement)
+        self.assertEqual(permissions.requirement('').all_of, frozenset())
+        with self.assertRaises(TypeError):
+            permissions.requirement(any_of='post:drinks')
+
+    def test_compiled_once_per_token(self):
+        compiled = []
+
+        def prepare(payload):
+            compiled.append(payload)
+            return permissions.granted(payload)
+        cache = TokenCache(prepare=prepare)
+        token = ISSUER.mint(['get:drinks'])
+        for _ in range(3):
+            payload, granted = cache.verified(token, lambda token: {
+                'exp': 2 ** 40, 'permissions': ['get:drinks']})
+        self.assertEqual(granted, frozenset(['get:drinks']))
+        self.assertEqual(len(compiled), 1)
+
+
+class LocalIssuerTestCase(unittest.TestCase):
+    """Tokens minted in-process, checked by python-jose"""
+
+    def decode(self, token, **options):
+        from jose import jwt
+        return jwt.decode(token, ISSUER.jwk(), algorithms=['RS256'], audience=ISSUER.audience,
+                          issuer=ISSUER.issuer, **options)
+
+    def test_minted_tokens_verify(self):
+        from jose import jwt
+        token = ISSUER.mint(['get:drinks', 'post:drinks'], sub='auth0|1')
+        self.assertEqual(jwt.get_unverified_header(token)['kid'], 'local')
+        payload = self.decode(token)
+        self.assertEqual(payload['permissions'], ['get:drinks', 'post:drinks'])
+        self.assertEqual(payload['sub'], 'auth0|1')
+        self.assertEqual(payload['exp'] - payload['iat'], 3600)
+
+    def test_bad_tokens_rejected(self):
+        from jose import jwt
+        header, claims, signature = ISSUER.mint().split('.')
+        forged = ISSUER.mint(sub='someone else').split('.')[1]
+        with self.assertRaises(jwt.JWTError):
+            self.decode('.'.join((header, forged, signature)))
+        with self.assertRaises(jwt.ExpiredSignatureError):
+            self.decode(ISSUER.mint(ttl=-10))
+        other = LocalIssuer('issuer.test', 'tests', bits=1024)
+        with self.assertRaises(jwt.JWTError):
+            self.decode(other.mint())
+
+    def test_pem_round_trip(self):
+        pem = issuer.save_key(ISSUER.key)
+        self.assertEqual(issuer.load_key(pem), ISSUER.key)
+        # another issuer from the same PEM mints tokens the first one's key verifies
+        copy = LocalIssuer('issuer.test', 'tests', issuer.load_key(pem))
+        self.assertEqual(self.decode(copy.mint(sub='copy'))['sub'], 'copy')
+
+    def test_key_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'issuer.pem')
+            key = issuer.key_from_file(path, bits=1024)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+            self.assertEqual(issuer.key_from_file(path), key)
+            # another process minting with the file is trusted by the app
+            local = issuer.from_environ('issuer.test', 'tests', {
+                'AUTH_ISSUER': 'local', 'AUTH_ISSUER_KEY': path})
+            self.assertEqual(local.key, key)
+
+    def test_from_environ(self):
+        auth0 = issuer.from_environ('tenant.auth0.com', 'api', {})
+        self.assertIsInstance(auth0, issuer.Auth0Issuer)
+        self.assertEqual((auth0.issuer, auth0.audience), ('https://tenant.auth0.com/', 'api'))
+        self.assertIsInstance(
+            issuer.from_environ('tenant.auth0.com', 'api', {'AUTH_ISSUER': 'auth0'}),
+            issuer.Auth0Issuer)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#----------------------------------------------------------------------------#
+# Verified-token cache.
+#
+# Checking a token's RS256 signature costs far more than the rest of a
+# request's auth, and clients send the same bearer token with every request
+# until it expires. TokenCache remembers the payload of each token that
+# verified, keyed by the SHA-256 of the token (the token itself is never
+# kept), until the token's exp claim; the next request with that token skips
+# jwt.decode.
+#
+# The cache is an LRU of max_entries tokens. Tokens without an exp claim are
+# verified every time. A revocation hook, revoked(payload), is asked on
+# every hit as well as after decoding, so revoking a token (by jti, sub, ...)
+# takes effect at once rather than when its cache entry ages out; discard()
+# drops one token's entry.
+#
+# A prepare(payload) function, when given, derives something from each
+# payload once (auth.py compiles the token's permissions into a frozenset);
+# verified() returns it with the payload, cached alongside.
+#
+# stats() reports hits, misses and the hit rate; `python shared/benchmarks.py
+# token` compares decode throughput with and without the cache.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenRevoked(Exception):
+    pass
+
+
+def token_key(token):
+    if isinstance(token, str):
+        token = token.encode('utf-8')
+    return hashlib.sha256(token).digest()
+
+
+class TokenCache(object):
+    '''
+    token hash -> decoded payload, least recently used evicted first. Thread
+    safe. Payloads are shared between requests; treat them as read-only.
+    '''
+
+    def __init__(self, max_entries=4096, revoked=None, prepare=None, clock=time.time):
+        self.max_entries = max_entries
+        self.revoked = revoked
+        self.prepare = prepare
+        self.clock = clock  # seconds since the epoch, as exp is
+        # key -> (exp, (payload, prepared)), least recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, token, decode):
+        '''
+        The payload of token: cached, or decode(token), which raises if the
+        token does not verify. Raises TokenRevoked if the revocation hook
+        rejects the payload.
+        '''
+        return self.verified(token, decode)[0]
+
+    def verified(self, token, decode):
+        '''
+        (payload, prepare(payload)) for token, as verify(); prepared is None
+        without a prepare function.
+        '''
+        key = token_key(token)
+        entry = self.lookup(key)
+        if entry is None:
+            payload = decode(token)
+            entry = (payload, self.prepare(payload) if self.prepare is not None else None)
+            self.check_revoked(key, payload)
+            self.store(key, entry)
+        else:
+            self.check_revoked(key, entry[0])
+        return entry
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def store(self, key, entry):
+        exp = entry[0].get('exp')
+        if not isinstance(exp, (int, float)) or exp <= self.clock():
+            return
+        with self.lock:
+            self.entries[key] = (exp, entry)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def check_revoked(self, key, payload):
+        if self.revoked is not None and self.revoked(payload):
+            with self.lock:
+                self.entries.pop(key, None)
+            raise TokenRevoked('token has been revoked')
+
+    def discard(self, token):
+        with self.lock:
+            self.entries.pop(token_key(token), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }